@@ -1,110 +1,77 @@
 import streamlit as st
-import face_recognition
-import cv2
-import numpy as np
-import os
+import hashlib
 import pandas as pd
-from datetime import datetime
+import time
 
 import auth  # <--- IMPORT THE NEW FILE
+from attendance_log import get_attendance_log
+from attendance_session import AttendanceSession
+import metrics
+import resources
+from worker_pool import QueueFull
 
 # --- LOGIN CHECK (Add this block right here) ---
 if not auth.check_password():
     st.stop()  # Stop the script if not logged in
     
 # --- CONFIGURATION ---
-KNOWN_FACES_DIR = "known_faces"
-ATTENDANCE_FILE = "attendance_log.csv"
-
-# --- 1. FUNCTION TO LOAD KNOWN FACES ---
-@st.cache_resource
-def load_known_faces():
-    known_encodings = []
-    known_names = []
-    
-    if not os.path.exists(KNOWN_FACES_DIR):
-        os.makedirs(KNOWN_FACES_DIR)
-        return [], []
-
-    for filename in os.listdir(KNOWN_FACES_DIR):
-        if filename.endswith((".jpg", ".png", ".jpeg")):
-            filepath = os.path.join(KNOWN_FACES_DIR, filename)
-            image = face_recognition.load_image_file(filepath)
-            try:
-                encoding = face_recognition.face_encodings(image)[0]
-                name = os.path.splitext(filename)[0]
-                known_encodings.append(encoding)
-                known_names.append(name)
-            except IndexError:
-                pass
-    
-    return known_encodings, known_names
-
-# --- 2. FUNCTION TO SAVE ATTENDANCE ---
-def mark_attendance(name, status):
-    if not os.path.exists(ATTENDANCE_FILE):
-        with open(ATTENDANCE_FILE, 'w') as f:
-            f.write('Name,Time,Date,Status\n')
-            
-    with open(ATTENDANCE_FILE, 'a') as f:
-        now = datetime.now()
-        time_str = now.strftime('%H:%M:%S')
-        date_str = now.strftime('%Y-%m-%d')
-        f.write(f'{name},{time_str},{date_str},{status}\n')
-
-# --- 3. FUNCTION TO PROCESS AN IMAGE (from camera or upload) ---
-# We make this a function to avoid duplicating code
-def process_image(image_bytes, known_encodings, known_names):
-    # Convert the file buffer to an image OpenCV can read
-    cv2_img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
-    
-    # Convert BGR (OpenCV standard) to RGB (face_recognition standard)
-    rgb_img = cv2.cvtColor(cv2_img, cv2.COLOR_BGR2RGB)
-
-    # Find faces
-    face_locations = face_recognition.face_locations(rgb_img)
-    face_encodings = face_recognition.face_encodings(rgb_img, face_locations)
-
-    st.success(f"Found {len(face_locations)} faces in the image.")
-
-    found_names = []
-
-    # Process each face found
-    for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-        matches = face_recognition.compare_faces(known_encodings, face_encoding, tolerance=0.6)
-        name = "Unknown"
-        
-        face_distances = face_recognition.face_distance(known_encodings, face_encoding)
-        best_match_index = np.argmin(face_distances)
-        
-        if matches[best_match_index]:
-            name = known_names[best_match_index]
-        
-        found_names.append(name)
-
-        # Draw box on the image for the UI
-        color = (0, 255, 0) if name != "Unknown" else (0, 0, 255)
-        cv2.rectangle(cv2_img, (left, top), (right, bottom), color, 2)
-        cv2.putText(cv2_img, name, (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
-
-    # Show the annotated image
-    st.image(cv2_img, channels="BGR", caption="Processed Image")
+# How faces are paired with students: each student can match at most one face.
+# "greedy" takes the closest pairs first, "hungarian" (needs scipy) minimises the total distance.
+MATCH_METHOD = "greedy"
+# Resize factor for face detection (None = shrink to recognition.DETECTION_MAX_SIDE).
+# Lower is faster but can miss small faces at the back of the room.
+DETECTION_SCALE = None
 
-    # --- REPORTING & CHARTING ---
-    st.subheader("Attendance Report")
-
-    present_students = set(name for name in found_names if name != "Unknown")
-    all_students = set(known_names)
-    absent_students = all_students - present_students
-
-    attendance_data = []
-    for student in all_students:
-        status = "Present" if student in present_students else "Absent"
-        attendance_data.append({"Student Name": student, "Status": status})
-        
-        # Save to CSV file
-        mark_attendance(student, status)
+# How often the page checks whether the recognition workers are done (seconds)
+POLL_INTERVAL = 0.1
 
+# --- 1. FUNCTION TO PROCESS AN IMAGE (from camera or upload) ---
+# We make this a function to avoid duplicating code
+def run_recognition(image_bytes):
+    """
+    Hands the photo to the recognition workers and waits for the result.
+    The heavy work happens in the worker processes; this thread only sleeps
+    between polls. The job id is kept in session_state, so if the page
+    re-runs while a photo is still being processed we pick the same job up
+    again instead of submitting it twice; once it is done, the pool's
+    result cache answers reruns and re-uploads of the same photo.
+    """
+    pool = resources.get_recognition_pool(MATCH_METHOD, DETECTION_SCALE)
+    jobs = st.session_state.setdefault("recognition_jobs", {})
+    job_key = hashlib.sha1(image_bytes).hexdigest()
+
+    if job_key not in jobs:
+        try:
+            jobs[job_key] = pool.submit(image_bytes, resources.get_face_store().version)
+        except QueueFull:
+            st.warning("⏳ The server is busy with other classes' photos. Please try again in a few seconds.")
+            return None
+        except Exception as e:
+            st.error(f"Could not process the photo: {e}")
+            return None
+
+    try:
+        with st.spinner("Recognising faces..."):
+            result = pool.poll(jobs[job_key])
+            while result is None:
+                time.sleep(POLL_INTERVAL)
+                result = pool.poll(jobs[job_key])
+    except KeyError:
+        # The job is gone (e.g. its result expired): forget it and let the user retry
+        del jobs[job_key]
+        st.warning("This photo's result has expired. Please submit it again.")
+        return None
+    except Exception as e:
+        del jobs[job_key]
+        st.error(f"Could not process the photo: {e}")
+        return None
+
+    del jobs[job_key]
+    return result
+
+
+def show_report(attendance_data):
+    """Table and Present/Absent chart for a list of {"Student Name", "Status", ...} rows."""
     df = pd.DataFrame(attendance_data)
 
     # 1. Show the Data Table
@@ -112,22 +79,130 @@ def process_image(image_bytes, known_encodings, known_names):
 
     # 2. Show the Bar Chart
     st.subheader("Visual Chart")
+    present_count = sum(1 for row in attendance_data if row["Status"] == "Present")
     count_data = pd.DataFrame({
         "Status": ["Present", "Absent"],
-        "Count": [len(present_students), len(absent_students)]
+        "Count": [present_count, len(attendance_data) - present_count]
     })
     st.bar_chart(count_data.set_index("Status"))
 
-    st.success(f"Attendance has been logged to '{ATTENDANCE_FILE}'!")
 
-# --- 4. THE MAIN UI ---
+def show_timings(timings):
+    # Show how long each step took (useful for tuning DETECTION_SCALE)
+    with st.expander("⏱️ Processing Time"):
+        st.dataframe(pd.DataFrame({
+            "Stage": list(timings),
+            "Time (ms)": [round(t * 1000, 1) for t in timings.values()],
+        }).set_index("Stage"))
+
+
+def process_image(image_bytes, session=None):
+    """Recognises one photo, then either logs it or (in session mode) adds it to the session."""
+    result = run_recognition(image_bytes)
+    if result is None:
+        return
+    timings = dict(result.timings)
+
+    st.success(f"Found {len(result.boxes)} faces in the image.")
+
+    # Show the annotated image (boxes and names were drawn by the worker)
+    st.image(result.image, caption="Processed Image")
+
+    if session is not None:
+        # Session mode: keep the faces as evidence, log nothing until the session is closed
+        if result.key in st.session_state.get("session_logged_photos", set()):
+            st.info("This photo was already logged with an earlier session.")
+        elif session.add_result(result):
+            st.success(f"Added to the session ({len(session)} photo(s) so far).")
+        else:
+            st.info("This photo is already part of the session.")
+        show_timings(timings)
+        return
+
+    # --- REPORTING & CHARTING ---
+    st.subheader("Attendance Report")
+
+    present_students = set(name for name in result.names if name != "Unknown")
+    all_students = set(result.roster)
+
+    attendance_data = []
+    statuses = {}
+    for student in all_students:
+        status = "Present" if student in present_students else "Absent"
+        attendance_data.append({"Student Name": student, "Status": status})
+        statuses[student] = status
+
+    # Save the whole class to the CSV file in one locked write. Streamlit
+    # re-runs the page on every click and re-uploads hit the result cache,
+    # so each photo is only logged the first time we see it.
+    attendance_log = get_attendance_log()
+    logged = resources.get_recognition_pool(MATCH_METHOD, DETECTION_SCALE).claim_log(result.key)
+    if logged:
+        start = time.perf_counter()
+        attendance_log.log_session(statuses)
+        timings["log"] = time.perf_counter() - start
+        metrics.record_timings({"log": timings["log"]})
+
+    show_report(attendance_data)
+
+    if logged:
+        st.success(f"Attendance has been logged to '{attendance_log.location}'!")
+    else:
+        st.info("This photo was already logged, so it wasn't saved again.")
+
+    show_timings(timings)
+
+
+def get_session():
+    """The open multi-photo session for this browser tab (re-matched if the gallery changed)."""
+    gallery_version = resources.get_face_store().version
+    session = st.session_state.get("attendance_session")
+    if session is None or session.closed:
+        session = st.session_state["attendance_session"] = AttendanceSession()
+        st.session_state["attendance_session_gallery"] = gallery_version
+    elif st.session_state.get("attendance_session_gallery") != gallery_version:
+        # A student was added or removed: re-use the stored encodings, no photo is processed again
+        session.rematch(resources.get_matcher(), method=MATCH_METHOD)
+        st.session_state["attendance_session_gallery"] = gallery_version
+    return session
+
+
+def show_session(session):
+    """Running roster of the session and the buttons to log or discard it."""
+    st.subheader(f"📚 Session Roster ({len(session)} photo(s))")
+    if not len(session):
+        st.write("Take or upload photos of the class; they are combined here.")
+        return
+
+    show_report(session.report())
+
+    col1, col2 = st.columns(2)
+    if col1.button("✅ Close Session & Log Attendance"):
+        attendance_log = get_attendance_log()
+        start = time.perf_counter()
+        session.close(attendance_log)
+        metrics.record_timings({"log": time.perf_counter() - start})
+        # The photos still sitting in the camera/upload widgets must not be logged again
+        pool = resources.get_recognition_pool(MATCH_METHOD, DETECTION_SCALE)
+        for key in session.photo_keys():
+            pool.claim_log(key)
+        st.session_state.setdefault("session_logged_photos", set()).update(session.photo_keys())
+        st.success(f"Attendance for {len(session)} photo(s) has been logged to '{attendance_log.location}'!")
+    if col2.button("🗑️ Discard Session"):
+        del st.session_state["attendance_session"]
+        st.rerun()
+
+# --- 2. THE MAIN UI ---
 st.title("📸 Smart Attendance System")
 
-# Load the database
-known_encodings, known_names = load_known_faces()
+# Load the database and start the recognition workers in the background, so
+# this page opens straight away and the first photo doesn't wait for them.
+# (The gallery is shared by every page, so new students show up without a reload.)
+resources.prewarm(MATCH_METHOD, DETECTION_SCALE)
 
 # Show the list of students expected (the database)
 if st.checkbox("Show Class List (Database)"):
+    known_names = resources.get_matcher().names
     if known_names:
         st.write(f"Loaded {len(known_names)} students: {', '.join(known_names)}")
     else:
@@ -135,6 +210,11 @@ if st.checkbox("Show Class List (Database)"):
 
 st.info("Use your webcam to take a picture OR upload an existing photo.")
 
+# Several photos of the same class (e.g. retakes for students who were hidden)
+# are combined into one roster and logged once
+session_mode = st.checkbox("📚 Multi-photo session (combine several photos, log once)")
+session = get_session() if session_mode else None
+
 # --- INPUT OPTION 1: CAMERA ---
 img_file_buffer = st.camera_input("Take a picture of the class")
 
@@ -146,9 +226,12 @@ uploaded_file = st.file_uploader("Or upload a class photo", type=["jpg", "png",
 if img_file_buffer is not None:
     # A photo was taken with the camera
     st.write("Processing camera photo...")
-    process_image(img_file_buffer.getvalue(), known_encodings, known_names)
+    process_image(img_file_buffer.getvalue(), session)
 
 elif uploaded_file is not None:
     # A file was uploaded
     st.write("Processing uploaded file...")
-    process_image(uploaded_file.getvalue(), known_encodings, known_names)
\ No newline at end of file
+    process_image(uploaded_file.getvalue(), session)
+
+if session is not None:
+    show_session(session)
\ No newline at end of file
@@ -1,114 +1,147 @@
-import face_recognition
-import cv2
+"""
+Headless attendance for one or many class photos.
+
+Examples:
+    python attendance.py                                  # every photo in test_images/
+    python attendance.py archive/2025-term1 --workers 8   # back-fill a whole folder
+    python attendance.py "archive/*/class_*.jpg" --annotate-dir annotated
+
+The gallery is loaded once (and once per worker process); photos are
+processed in parallel and each finished photo is written to the attendance
+log straight away, dated by the photo's modification time by default.
+"""
+import argparse
+import glob
 import os
-import numpy as np
-
-# --- 1. "Learning" Phase: Teach the program about your known students ---
-
-# Create empty lists to store the "face prints" (encodings) and their names
-known_face_encodings = []
-known_face_names = []
-
-# Define the path to your 'database' of known faces
-known_faces_dir = "known_faces"
-print("Loading known faces...")
-
-# Loop through every file in the known_faces folder
-for filename in os.listdir(known_faces_dir):
-    # Check if the file is an image
-    if filename.endswith((".jpg", ".png", ".jpeg")):
-        # Construct the full file path
-        filepath = os.path.join(known_faces_dir, filename)
-        
-        # Load the image
-        known_image = face_recognition.load_image_file(filepath)
-        
-        # Get the "face print" (encoding)
-        # We assume [0] because there is only ONE person in each known_face photo
-        try:
-            encoding = face_recognition.face_encodings(known_image)[0]
-            
-            # Get the name from the filename (e.g., "susan.jpg" -> "susan")
-            name = os.path.splitext(filename)[0]
-            
-            # Add the encoding and name to our lists
-            known_face_encodings.append(encoding)
-            known_face_names.append(name)
-            print(f"Learned: {name}")
-
-        except IndexError:
-            print(f"Warning: No face found in {filename}. Skipping.")
-
-
-print("...Learning complete.")
-print("--------------------")
-
-# --- 2. "Recognition" Phase: Find and identify people in the class photo ---
-
-# Define the path to your test image (MAKE SURE THIS FILENAME IS CORRECT)
-test_image_path = "test_images/class_photo.jpg"
-
-# Load the test image (the "class photo")
-# We load it with face_recognition to find faces
-unknown_image_fr = face_recognition.load_image_file(test_image_path)
-
-# We ALSO load it with OpenCV to be able to draw on it later
-# (OpenCV and face_recognition load colors in a different order: BGR vs RGB)
-unknown_image_cv = cv2.imread(test_image_path)
-
-# Find all the locations of faces in the class photo
-unknown_face_locations = face_recognition.face_locations(unknown_image_fr)
-# Get the "face prints" for all those faces
-unknown_face_encodings = face_recognition.face_encodings(unknown_image_fr, unknown_face_locations)
-
-print(f"Found {len(unknown_face_locations)} faces in the class photo.")
-
-# Create a list to hold the names of people who are present
-students_present = []
-
-# Loop through each face found in the unknown image
-for (top, right, bottom, left), face_encoding in zip(unknown_face_locations, unknown_face_encodings):
-    
-    # Compare this unknown face to ALL the known faces
-    matches = face_recognition.compare_faces(known_face_encodings, face_encoding, tolerance=0.6)
-    
-    name = "Unknown" # Default name if no match is found
-
-    # This part finds the *best* match if there are multiple
-    face_distances = face_recognition.face_distance(known_face_encodings, face_encoding)
-    best_match_index = np.argmin(face_distances)
-    
-    if matches[best_match_index]:
-        name = known_face_names[best_match_index]
-        
-        # Add to our present list, but only if they aren't already in it
-        if name not in students_present:
-            students_present.append(name)
-
-    # --- 3. "Reporting" Phase: Draw boxes and show the result ---
-
-    # Draw a green box around the face
-    cv2.rectangle(unknown_image_cv, (left, top), (right, bottom), (0, 255, 0), 2)
-    
-    # Draw a black label with the name below the face
-    cv2.rectangle(unknown_image_cv, (left, bottom - 25), (right, bottom), (0, 0, 0), cv2.FILLED)
-    font = cv2.FONT_HERSHEY_DUPLEX
-    cv2.putText(unknown_image_cv, name, (left + 6, bottom - 6), font, 0.8, (255, 255, 255), 1)
-
-# --- Final Output ---
-
-# 1. Print the text report to the terminal
-print("--------------------")
-print("Attendance Report:")
-if students_present:
-    for student in students_present:
-        print(f"- {student} (Present)")
-else:
-    print("No known students were found.")
-print("--------------------")
-
-# 2. Show the final image with boxes and names
-print("Displaying results. Press any key to close the image window.")
-cv2.imshow("Smart Attendance Result", unknown_image_cv)
-cv2.waitKey(0) # Wait until the user presses a key
-cv2.destroyAllWindows() # Close the image window
\ No newline at end of file
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import cv2
+
+import recognition
+from attendance_log import ATTENDANCE_BACKEND, get_attendance_log
+from face_store import FaceStore, IMAGE_EXTENSIONS, KNOWN_FACES_DIR
+from matcher import FaceMatcher, UNKNOWN
+
+# --- CONFIGURATION ---
+DEFAULT_INPUT = "test_images"
+
+# Set once per worker process by _init_worker()
+_matcher = None
+
+
+# --- 1. FINDING THE PHOTOS ---
+def find_photos(inputs):
+    """Expands folders and glob patterns into a sorted list of image files."""
+    photos = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for filename in os.listdir(item):
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    photos.add(os.path.join(item, filename))
+        else:
+            # Windows shells don't expand wildcards, so we do it ourselves
+            for path in glob.glob(item) or [item]:
+                if os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS):
+                    photos.add(path)
+    return sorted(photos)
+
+
+# --- 2. WORKER SIDE ---
+def _init_worker(faces_dir, tolerance):
+    """Loads the gallery once per worker (a plain mmap, the parent already synced it)."""
+    global _matcher
+    store = FaceStore(faces_dir, read_only=True).load()
+    _matcher = FaceMatcher(store.encodings, store.names, tolerance=tolerance)
+
+
+def _process_photo(path, annotate_dir, scale, tiled=False):
+    """Recognises one photo. Returns (path, present names, face count, error)."""
+    try:
+        bgr_img = cv2.imread(path)
+        if bgr_img is None:
+            return path, [], 0, "could not read image"
+        rgb_img = cv2.cvtColor(bgr_img, cv2.COLOR_BGR2RGB)
+
+        # With many photos the workers are already one per core, so no tiling
+        # pool inside them; a single photo may be tiled (tiled=None: if it is big)
+        result = recognition.recognize(rgb_img, _matcher, scale=scale, tiled=tiled)
+        names = [m.name for m in result.matches]
+
+        if annotate_dir:
+            for (top, right, bottom, left), name in zip(result.boxes, names):
+                # Draw a green box around the face and a black label below it
+                cv2.rectangle(bgr_img, (left, top), (right, bottom), (0, 255, 0), 2)
+                cv2.rectangle(bgr_img, (left, bottom - 25), (right, bottom), (0, 0, 0), cv2.FILLED)
+                cv2.putText(bgr_img, name, (left + 6, bottom - 6), cv2.FONT_HERSHEY_DUPLEX, 0.8, (255, 255, 255), 1)
+            cv2.imwrite(os.path.join(annotate_dir, os.path.basename(path)), bgr_img)
+
+        present = sorted(set(n for n in names if n != UNKNOWN))
+        return path, present, len(result.boxes), None
+    except Exception as e:
+        return path, [], 0, str(e)
+
+
+# --- 3. MAIN ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="*", default=[DEFAULT_INPUT],
+                        help="photo files, folders or glob patterns (default: test_images)")
+    parser.add_argument("--known-faces", default=KNOWN_FACES_DIR, help="folder of enrolled student photos")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="parallel photos (default: all cores)")
+    parser.add_argument("--annotate-dir", help="write a copy of every photo with boxes and names here")
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default=ATTENDANCE_BACKEND,
+                        help="attendance storage (default: ATTENDANCE_BACKEND, i.e. csv)")
+    parser.add_argument("--log", help="CSV file or SQLite database to write to (default: the backend's usual file)")
+    parser.add_argument("--no-log", action="store_true", help="only print the report, don't write the log")
+    parser.add_argument("--timestamp", choices=["mtime", "now"], default="mtime",
+                        help="date the log rows by the photo's modification time (default) or by now")
+    parser.add_argument("--scale", type=float, default=None, help="detection resize factor (default: automatic)")
+    parser.add_argument("--tolerance", type=float, default=0.6)
+    args = parser.parse_args(argv)
+
+    photos = find_photos(args.inputs)
+    if not photos:
+        print("No photos found.")
+        return 1
+    if args.annotate_dir:
+        os.makedirs(args.annotate_dir, exist_ok=True)
+
+    # --- "Learning" Phase: only new or changed student photos are encoded ---
+    print("Loading known faces...")
+    store = FaceStore(args.known_faces).load()
+    roster = sorted(set(store.names))
+    print(f"...{len(roster)} students loaded. Processing {len(photos)} photo(s) with {args.workers} worker(s).")
+    print("--------------------")
+
+    # --- "Recognition" Phase: photos in parallel, results logged as they finish ---
+    attendance_log = get_attendance_log(args.backend, args.log)
+    failures = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(args.known_faces, args.tolerance)) as pool:
+        tiled = None if len(photos) == 1 else False
+        futures = [pool.submit(_process_photo, path, args.annotate_dir, args.scale, tiled) for path in photos]
+        for future in as_completed(futures):
+            path, present, n_faces, error = future.result()
+            if error:
+                failures += 1
+                print(f"[skipped] {path}: {error}")
+                continue
+
+            print(f"{path}: {n_faces} faces, {len(present)}/{len(roster)} present"
+                  + (f" ({', '.join(present)})" if present else ""))
+
+            if not args.no_log:
+                when = datetime.fromtimestamp(os.path.getmtime(path)) if args.timestamp == "mtime" else datetime.now()
+                present_set = set(present)
+                statuses = {s: "Present" if s in present_set else "Absent" for s in roster}
+                attendance_log.log_session(statuses, when=when)
+
+    print("--------------------")
+    print(f"Done: {len(photos) - failures} processed, {failures} skipped.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import uuid
+
+import pandas as pd
+
+# --- CONFIGURATION ---
+# Closed days of attendance_log.csv are moved here as one folder per date:
+#   attendance_archive/date=2025-11-27/part-<hash>.parquet
+# plus manifest.json (dates and names) and daily_summary.parquet (the rollup).
+# Needs pyarrow for pandas' parquet support.
+ARCHIVE_DIR = "attendance_archive"
+MANIFEST_FILE = "manifest.json"
+DAILY_FILE = "daily_summary.parquet"
+ROW_COLUMNS = ["Name", "Time", "Date", "Status", "Session"]
+DAILY_COLUMNS = ["Name", "Date", "Present", "Sessions"]
+
+
+def _partition_dir(archive_dir, date_str):
+    return os.path.join(archive_dir, f"date={date_str}")
+
+
+def _replace_atomically(path, write):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def read_manifest(archive_dir=ARCHIVE_DIR):
+    """Returns {"dates": [...], "names": [...]} for the archive (empty if there is none)."""
+    try:
+        with open(os.path.join(archive_dir, MANIFEST_FILE), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"dates": [], "names": []}
+
+
+def manifest_version(archive_dir=ARCHIVE_DIR):
+    """Changes whenever the archive is written to (used in cache keys)."""
+    path = os.path.join(archive_dir, MANIFEST_FILE)
+    return os.stat(path).st_mtime_ns if os.path.exists(path) else None
+
+
+def _to_columnar(rows):
+    """Compact column types: categorical names/status, no per-row date strings."""
+    rows = rows[ROW_COLUMNS].copy()
+    rows["Name"] = rows["Name"].astype("category")
+    rows["Status"] = rows["Status"].astype("category")
+    rows["Session"] = rows["Session"].fillna("").astype("category")
+    return rows.drop(columns=["Date"])   # the date is the partition folder
+
+
+def write_days(rows, archive_dir=ARCHIVE_DIR):
+    """
+    Appends closed-day rows (a DataFrame with ROW_COLUMNS, Date as "YYYY-MM-DD"
+    strings) to the archive, one parquet file per date.
+
+    Part files are named after a hash of their content, so running the same
+    compaction twice (e.g. after a crash) doesn't duplicate rows. Returns the
+    dates written.
+    """
+    if rows.empty:
+        return []
+    os.makedirs(archive_dir, exist_ok=True)
+
+    dates = sorted(rows["Date"].unique())
+    for date_str, day in rows.groupby("Date", sort=True):
+        folder = _partition_dir(archive_dir, date_str)
+        os.makedirs(folder, exist_ok=True)
+        digest = hashlib.sha1(day[ROW_COLUMNS].to_csv(index=False).encode("utf-8")).hexdigest()[:16]
+        part_path = os.path.join(folder, f"part-{digest}.parquet")
+        if not os.path.exists(part_path):
+            table = _to_columnar(day)
+            _replace_atomically(part_path, lambda p: table.to_parquet(p, index=False))
+
+    _update_daily_summary(archive_dir, dates)
+
+    manifest = read_manifest(archive_dir)
+    manifest["dates"] = sorted(set(manifest["dates"]) | set(dates))
+    manifest["names"] = sorted(set(manifest["names"]) | set(rows["Name"].unique()))
+
+    def write_manifest(path):
+        with open(path, "w") as f:
+            json.dump(manifest, f)
+    _replace_atomically(os.path.join(archive_dir, MANIFEST_FILE), write_manifest)
+    return dates
+
+
+def _read_partition(archive_dir, date_str, columns=None, names=None):
+    folder = _partition_dir(archive_dir, date_str)
+    if not os.path.isdir(folder):
+        return None
+    parts = []
+    for filename in sorted(os.listdir(folder)):
+        if filename.endswith(".parquet"):
+            filters = [("Name", "in", list(names))] if names is not None else None
+            parts.append(pd.read_parquet(os.path.join(folder, filename), columns=columns, filters=filters))
+    if not parts:
+        return None
+    day = pd.concat(parts, ignore_index=True)
+    day["Date"] = date_str
+    return day
+
+
+def _update_daily_summary(archive_dir, dates):
+    """Recomputes the rollup rows for the given dates from their partitions."""
+    fresh = []
+    for date_str in dates:
+        day = _read_partition(archive_dir, date_str, columns=["Name", "Status"])
+        if day is None:
+            continue
+        day["Present"] = (day["Status"].astype(str) == "Present").astype("int8")
+        fresh.append(day.groupby("Name", observed=True).agg(
+            Present=("Present", "max"), Sessions=("Present", "size")).reset_index().assign(Date=date_str))
+
+    daily = read_daily(archive_dir)
+    daily = daily[~daily["Date"].isin(dates)]
+    if fresh:
+        daily = pd.concat([daily] + [f[DAILY_COLUMNS] for f in fresh], ignore_index=True)
+    daily["Name"] = daily["Name"].astype(str)
+    _replace_atomically(os.path.join(archive_dir, DAILY_FILE), lambda p: daily.to_parquet(p, index=False))
+
+
+def read_daily(archive_dir=ARCHIVE_DIR):
+    """Returns the archived per-student-per-day rollup (DAILY_COLUMNS)."""
+    path = os.path.join(archive_dir, DAILY_FILE)
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=DAILY_COLUMNS)
+    return pd.read_parquet(path)
+
+
+def read_range(start_date, end_date, names=None, archive_dir=ARCHIVE_DIR):
+    """
+    Loads archived rows between two dates (inclusive), reading only the
+    partitions in that range and, if given, only the rows for 'names'.
+    """
+    start, end = str(start_date), str(end_date)
+    days = []
+    for date_str in read_manifest(archive_dir)["dates"]:
+        if start <= date_str <= end:
+            day = _read_partition(archive_dir, date_str, names=names)
+            if day is not None:
+                days.append(day)
+    if not days:
+        return pd.DataFrame(columns=ROW_COLUMNS)
+
+    rows = pd.concat(days, ignore_index=True)
+    rows["Date"] = pd.to_datetime(rows["Date"])
+    for col in ("Name", "Status", "Session"):
+        rows[col] = rows[col].astype(str).astype("category")
+    return rows[ROW_COLUMNS]
@@ -0,0 +1,482 @@
+import contextlib
+import csv
+import io
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from collections import Counter
+from datetime import date, datetime
+
+import pandas as pd
+
+import attendance_archive
+from attendance_archive import ARCHIVE_DIR
+from file_locks import file_lock
+
+# --- CONFIGURATION ---
+# Where attendance is stored: "csv" (attendance_log.csv) or "sqlite" (attendance.db).
+# Run `python attendance_log.py import-csv` once before switching to sqlite.
+ATTENDANCE_BACKEND = os.environ.get("ATTENDANCE_BACKEND", "csv")
+ATTENDANCE_FILE = "attendance_log.csv"
+ATTENDANCE_DB = "attendance.db"
+COLUMNS = ["Name", "Time", "Date", "Status", "Session"]
+
+
+def new_session_id():
+    """A short unique ID that ties together all rows written for one photo."""
+    return uuid.uuid4().hex[:12]
+
+
+def _ensure_header(path):
+    """Creates the log, or adds the Session column to a log from before it existed. Call with the lock held."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        with open(path, "w", newline="") as f:
+            csv.writer(f, lineterminator="\n").writerow(COLUMNS)
+        return
+
+    with open(path, "r", newline="") as f:
+        header = next(csv.reader(f), [])
+    if header == COLUMNS:
+        return
+
+    # One-time upgrade: old rows get an empty Session
+    tmp_path = path + ".tmp"
+    with open(path, "r", newline="") as src, open(tmp_path, "w", newline="") as dst:
+        reader = csv.reader(src)
+        writer = csv.writer(dst, lineterminator="\n")
+        next(reader, None)
+        writer.writerow(COLUMNS)
+        for row in reader:
+            if row:
+                writer.writerow((row + [""] * len(COLUMNS))[:len(COLUMNS)])
+    os.replace(tmp_path, path)
+
+
+# --- 1. DAILY SUMMARY HELPERS ---
+# Both backends keep a per-student-per-day rollup next to the raw rows:
+#   Name, Date, Present (1 if marked Present in any photo that day), Sessions
+# so the history summary never has to group the raw log.
+DAILY_COLUMNS = ["Name", "Date", "Present", "Sessions"]
+
+
+def summarize_daily(daily):
+    """Turns a daily rollup into the per-student attendance summary table."""
+    if daily.empty:
+        return pd.DataFrame(columns=["Name", "Total Days Present", "Total Days Logged", "Attendance Percentage"])
+    total_days_logged = daily['Date'].nunique()
+    summary = daily[daily['Present'] > 0].groupby('Name').size().reset_index(name='Total Days Present')
+    summary['Total Days Logged'] = total_days_logged
+    summary['Attendance Percentage'] = ((summary['Total Days Present'] / summary['Total Days Logged']) * 100).round(1)
+    return summary
+
+
+class _CSVRollup:
+    """
+    In-memory daily rollup of a CSV log, maintained by tailing the file.
+
+    The log is append-only, so each refresh only parses the bytes written
+    since the last one (by this process or any other). It starts over if
+    the file was replaced (header upgrade or compaction), seeded with the
+    archive's own rollup for the days that were moved out of the CSV.
+    """
+
+    def __init__(self, path, archive_dir):
+        self.path = path
+        self.archive_dir = archive_dir
+        self.by_date = {}    # "YYYY-MM-DD" -> {name: [present, sessions]}
+        self._offset = 0
+        self._inode = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        with self._lock:
+            if not os.path.exists(self.path):
+                return
+            stat = os.stat(self.path)
+            if stat.st_ino != self._inode or stat.st_size < self._offset:
+                self.by_date, self._offset, self._inode = {}, 0, stat.st_ino
+                for name, date_str, present, sessions in attendance_archive.read_daily(
+                        self.archive_dir)[DAILY_COLUMNS].itertuples(index=False):
+                    self.by_date.setdefault(date_str, {})[name] = [int(present), int(sessions)]
+            if stat.st_size == self._offset:
+                return
+
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read(stat.st_size - self._offset)
+            # Only consume complete lines; a half-written one is picked up next time
+            end = data.rfind(b"\n") + 1
+            lines = data[:end].decode("utf-8").splitlines()
+            if self._offset == 0:
+                lines = lines[1:]   # header
+            self._offset += end
+
+            for row in csv.reader(lines):
+                if len(row) < 4:
+                    continue
+                name, _, date_str, status = row[:4]
+                counts = self.by_date.setdefault(date_str, {}).setdefault(name, [0, 0])
+                if status == "Present":
+                    counts[0] = 1
+                counts[1] += 1
+
+    def daily(self, names, start_date, end_date):
+        self.refresh()
+        start, end = str(start_date), str(end_date)
+        wanted = set(names)
+        rows = []
+        with self._lock:
+            for date_str, per_name in self.by_date.items():
+                if start <= date_str <= end:
+                    for name, (present, sessions) in per_name.items():
+                        if name in wanted:
+                            rows.append((name, date_str, present, sessions))
+        return pd.DataFrame(rows, columns=DAILY_COLUMNS)
+
+
+_csv_rollups = {}   # path -> _CSVRollup, shared by every session of the server
+
+
+# --- 2. CSV BACKEND (default) ---
+_csv_cache = {}   # path -> ((mtime_ns, size), parsed DataFrame)
+
+
+class CSVAttendanceLog:
+    """
+    The original attendance_log.csv.
+
+    compact() moves closed days into a date-partitioned parquet archive
+    (see attendance_archive.py); queries then read only the archive
+    partitions in the selected range plus the small live CSV.
+    """
+
+    def __init__(self, path=ATTENDANCE_FILE, archive_dir=ARCHIVE_DIR):
+        self.path = path
+        self.archive_dir = archive_dir
+        self.location = path
+
+    def exists(self):
+        return os.path.exists(self.path) or bool(attendance_archive.read_manifest(self.archive_dir)["dates"])
+
+    def log_session(self, statuses, when=None, session_id=None):
+        """
+        Writes a whole roster (one photo's Present/Absent rows) in one locked append.
+
+        statuses -> {student name: "Present" or "Absent"}
+        when     -> timestamp for every row (default: now)
+        Returns the session ID written with the rows.
+        """
+        rows, session_id = _session_rows(statuses, when, session_id)
+
+        # Build all rows first so the file is only touched once
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(rows)
+
+        with file_lock(self.path):
+            _ensure_header(self.path)
+            with open(self.path, "a", newline="") as f:
+                f.write(buffer.getvalue())
+                f.flush()
+                os.fsync(f.fileno())
+        return session_id
+
+    def _read(self):
+        # students(), date_range() and query() run on every page rerun, so the
+        # parsed file is kept until it changes on disk
+        if not os.path.exists(self.path):
+            return pd.DataFrame({c: pd.Series(dtype="datetime64[ns]" if c == "Date" else object) for c in COLUMNS})
+        stat = os.stat(self.path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = _csv_cache.get(self.path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        df = pd.read_csv(self.path)
+        # Make sure 'Date' is a proper datetime object for filtering
+        df['Date'] = pd.to_datetime(df['Date'])
+        _csv_cache[self.path] = (key, df)
+        return df
+
+    def students(self):
+        archived = attendance_archive.read_manifest(self.archive_dir)["names"]
+        return sorted(set(self._read()['Name'].unique()) | set(archived))
+
+    def date_range(self):
+        dates = [d.date() for d in self._read()['Date'].agg(['min', 'max']).dropna()]
+        archived = attendance_archive.read_manifest(self.archive_dir)["dates"]
+        if archived:
+            dates += [date.fromisoformat(archived[0]), date.fromisoformat(archived[-1])]
+        return min(dates), max(dates)
+
+    def query(self, names, start_date, end_date):
+        """Returns the rows for the given students between two dates (inclusive)."""
+        df = self._read()
+        live = df[
+            (df['Name'].isin(names)) &
+            (df['Date'] >= pd.to_datetime(start_date)) &
+            (df['Date'] <= pd.to_datetime(end_date))
+        ]
+        archived = attendance_archive.read_range(start_date, end_date, names, self.archive_dir)
+        if archived.empty:
+            return live
+        if live.empty:
+            return archived
+        return pd.concat([archived, live], ignore_index=True)
+
+    def version(self):
+        """Changes whenever the log is written to (used as a cache key)."""
+        stat = os.stat(self.path) if os.path.exists(self.path) else None
+        live = (stat.st_ino, stat.st_mtime_ns, stat.st_size) if stat else None
+        return (live, attendance_archive.manifest_version(self.archive_dir))
+
+    def compact(self, before=None):
+        """
+        Moves every row dated before 'before' (default: today) from the CSV
+        into the parquet archive and rewrites the CSV with what is left.
+        Returns the archived dates.
+        """
+        before = str(before or date.today())
+        with file_lock(self.path):
+            if not os.path.exists(self.path):
+                return []
+            _ensure_header(self.path)
+            df = pd.read_csv(self.path, dtype=str, keep_default_na=False)
+            closed = df[df['Date'] < before]
+            if closed.empty:
+                return []
+
+            dates = attendance_archive.write_days(closed, self.archive_dir)
+
+            tmp_path = self.path + ".tmp"
+            df[df['Date'] >= before].to_csv(tmp_path, index=False, lineterminator="\n")
+            os.replace(tmp_path, self.path)
+        return dates
+
+    def daily_summary(self, names, start_date, end_date):
+        """Returns the per-student-per-day rollup (DAILY_COLUMNS) for a date range."""
+        rollup = _csv_rollups.get(self.path)
+        if rollup is None:
+            rollup = _csv_rollups.setdefault(self.path, _CSVRollup(self.path, self.archive_dir))
+        return rollup.daily(names, start_date, end_date)
+
+
+# --- 3. SQLITE BACKEND ---
+class SQLiteAttendanceLog:
+    """
+    Attendance stored in SQLite with indexes on (date, name) and (name, date),
+    so the history page only reads the rows it actually shows.
+    """
+
+    def __init__(self, path=ATTENDANCE_DB):
+        self.path = path
+        self.location = path
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        if self.path not in _sqlite_ready:
+            self._create_schema(conn)
+            _sqlite_ready.add(self.path)
+        return conn
+
+    def _create_schema(self, conn):
+        conn.execute("PRAGMA journal_mode=WAL")   # readers don't block the writer
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS attendance (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                time TEXT NOT NULL,
+                date TEXT NOT NULL,
+                status TEXT NOT NULL,
+                session TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_attendance_date_name ON attendance (date, name);
+            CREATE INDEX IF NOT EXISTS idx_attendance_name_date ON attendance (name, date);
+
+            -- Per-student-per-day rollup, kept up to date by every write
+            CREATE TABLE IF NOT EXISTS daily_summary (
+                date TEXT NOT NULL,
+                name TEXT NOT NULL,
+                present INTEGER NOT NULL,
+                sessions INTEGER NOT NULL,
+                PRIMARY KEY (date, name)
+            );
+
+            -- Bumped on every write so readers can tell when cached results are stale
+            CREATE TABLE IF NOT EXISTS log_version (id INTEGER PRIMARY KEY CHECK (id = 0), version INTEGER NOT NULL);
+            INSERT OR IGNORE INTO log_version VALUES (0, 0);
+        """)
+        # Databases created before the rollup existed get it built once
+        has_rows = conn.execute("SELECT 1 FROM attendance LIMIT 1").fetchone()
+        has_rollup = conn.execute("SELECT 1 FROM daily_summary LIMIT 1").fetchone()
+        if has_rows and not has_rollup:
+            with conn:
+                self._rebuild_rollup(conn)
+
+    def _rebuild_rollup(self, conn):
+        conn.execute("DELETE FROM daily_summary")
+        conn.execute("""
+            INSERT INTO daily_summary (date, name, present, sessions)
+            SELECT date, name, MAX(status = 'Present'), COUNT(*)
+            FROM attendance GROUP BY date, name
+        """)
+        conn.execute("UPDATE log_version SET version = version + 1")
+
+    def exists(self):
+        if not os.path.exists(self.path):
+            return False
+        with contextlib.closing(self._connect()) as conn:
+            return conn.execute("SELECT 1 FROM attendance LIMIT 1").fetchone() is not None
+
+    def log_session(self, statuses, when=None, session_id=None):
+        """Writes a whole roster in one transaction. Returns the session ID."""
+        rows, session_id = _session_rows(statuses, when, session_id)
+        self._insert(rows)
+        return session_id
+
+    def _insert(self, rows):
+        """Inserts raw rows and folds them into the daily rollup, in one transaction."""
+        with contextlib.closing(self._connect()) as conn:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO attendance (name, time, date, status, session) VALUES (?, ?, ?, ?, ?)", rows)
+                conn.executemany("""
+                    INSERT INTO daily_summary (date, name, present, sessions) VALUES (?, ?, ?, 1)
+                    ON CONFLICT (date, name) DO UPDATE SET
+                        present = MAX(present, excluded.present),
+                        sessions = sessions + 1
+                """, [(r[2], r[0], int(r[3] == "Present")) for r in rows])
+                conn.execute("UPDATE log_version SET version = version + 1")
+
+    def students(self):
+        with contextlib.closing(self._connect()) as conn:
+            return [r[0] for r in conn.execute("SELECT DISTINCT name FROM attendance ORDER BY name")]
+
+    def date_range(self):
+        with contextlib.closing(self._connect()) as conn:
+            first, last = conn.execute("SELECT MIN(date), MAX(date) FROM attendance").fetchone()
+        return date.fromisoformat(first), date.fromisoformat(last)
+
+    def query(self, names, start_date, end_date):
+        """Returns the rows for the given students between two dates (inclusive)."""
+        sql = """
+            SELECT name AS Name, time AS Time, date AS Date, status AS Status, session AS Session
+            FROM attendance
+            WHERE date BETWEEN ? AND ?
+              AND name IN (SELECT value FROM json_each(?))
+            ORDER BY id
+        """
+        params = (str(start_date), str(end_date), json.dumps(list(names)))
+        with contextlib.closing(self._connect()) as conn:
+            df = pd.read_sql_query(sql, conn, params=params)
+        df['Date'] = pd.to_datetime(df['Date'])
+        return df
+
+    def version(self):
+        """Changes whenever the log is written to (used as a cache key)."""
+        if not os.path.exists(self.path):
+            return None
+        with contextlib.closing(self._connect()) as conn:
+            return conn.execute("SELECT version FROM log_version").fetchone()[0]
+
+    def daily_summary(self, names, start_date, end_date):
+        """Returns the per-student-per-day rollup (DAILY_COLUMNS) for a date range."""
+        sql = """
+            SELECT name AS Name, date AS Date, present AS Present, sessions AS Sessions
+            FROM daily_summary
+            WHERE date BETWEEN ? AND ?
+              AND name IN (SELECT value FROM json_each(?))
+        """
+        params = (str(start_date), str(end_date), json.dumps(list(names)))
+        with contextlib.closing(self._connect()) as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+
+_sqlite_ready = set()   # databases whose schema was checked by this process
+
+
+def import_csv(csv_path=ATTENDANCE_FILE, db_path=ATTENDANCE_DB, archive_dir=ARCHIVE_DIR):
+    """
+    One-shot copy of an existing CSV log into the SQLite database, including
+    the closed days that `compact` moved into the parquet archive. Rows the
+    database already has (same name, date, time and session) are skipped, so
+    running it again doesn't count anything twice. Returns the number of rows
+    added.
+    """
+    rows = []
+    dates = attendance_archive.read_manifest(archive_dir)["dates"]
+    if dates:
+        archived = attendance_archive.read_range(min(dates), max(dates), archive_dir=archive_dir)
+        archived["Date"] = archived["Date"].dt.strftime("%Y-%m-%d")
+        rows = archived[COLUMNS].astype(str).values.tolist()
+    if os.path.exists(csv_path) or not dates:
+        with open(csv_path, "r", newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            rows += [(row + [""] * len(COLUMNS))[:len(COLUMNS)] for row in reader if row]
+
+    db = SQLiteAttendanceLog(db_path)
+    with contextlib.closing(db._connect()) as conn:
+        # Counted, not a set: a roster logged twice in the same second is two rows
+        existing = Counter(conn.execute("SELECT name, date, time, COALESCE(session, '') FROM attendance"))
+    new_rows = []
+    for row in rows:
+        key = (row[0], row[2], row[1], row[4])
+        if existing[key]:
+            existing[key] -= 1
+        else:
+            new_rows.append(row)
+    if new_rows:
+        db._insert(new_rows)
+    return len(new_rows)
+
+
+def _session_rows(statuses, when, session_id):
+    if when is None:
+        when = datetime.now()
+    if session_id is None:
+        session_id = new_session_id()
+    time_str = when.strftime('%H:%M:%S')
+    date_str = when.strftime('%Y-%m-%d')
+    rows = [[name, time_str, date_str, status, session_id] for name, status in statuses.items()]
+    return rows, session_id
+
+
+def get_attendance_log(backend=None, path=None):
+    """Returns the configured attendance log ('csv' or 'sqlite')."""
+    backend = backend or ATTENDANCE_BACKEND
+    if backend == "csv":
+        return CSVAttendanceLog(path or ATTENDANCE_FILE)
+    if backend == "sqlite":
+        return SQLiteAttendanceLog(path or ATTENDANCE_DB)
+    raise ValueError(f"Unknown attendance backend: {backend}")
+
+
+def log_session(statuses, when=None, session_id=None):
+    """Writes one photo's roster to the configured attendance log."""
+    return get_attendance_log().log_session(statuses, when=when, session_id=session_id)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Attendance log tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import-csv", help="copy the CSV log (and its archive) into the SQLite database")
+    imp.add_argument("--csv", default=ATTENDANCE_FILE)
+    imp.add_argument("--db", default=ATTENDANCE_DB)
+    imp.add_argument("--archive", default=ARCHIVE_DIR)
+    comp = sub.add_parser("compact", help="move closed days of the CSV log into the parquet archive")
+    comp.add_argument("--csv", default=ATTENDANCE_FILE)
+    comp.add_argument("--archive", default=ARCHIVE_DIR)
+    comp.add_argument("--before", help="archive days before this date, YYYY-MM-DD (default: today)")
+    args = parser.parse_args()
+
+    if args.command == "import-csv":
+        count = import_csv(args.csv, args.db, args.archive)
+        print(f"Imported {count} new rows from '{args.csv}' into '{args.db}'.")
+        print("Set ATTENDANCE_BACKEND=sqlite before starting the app to use it.")
+    elif args.command == "compact":
+        dates = CSVAttendanceLog(args.csv, args.archive).compact(args.before)
+        print(f"Archived {len(dates)} day(s) from '{args.csv}' into '{args.archive}'.")
@@ -0,0 +1,119 @@
+"""
+One attendance session built from several photos of the same class.
+
+Each photo adds its face encodings and matches as evidence; per student we
+keep the best (smallest) distance and the number of photos they were found
+in. Nothing is written until close(), which logs a single roster for the
+whole session instead of one per photo.
+"""
+from collections import namedtuple
+
+from attendance_log import new_session_id
+from matcher import UNKNOWN
+
+# --- CONFIGURATION ---
+MIN_VOTES = 1   # photos a student must be found in to count as present
+
+# Fused evidence for one student.
+#   distance -> best (smallest) match distance over all photos
+#   votes    -> number of photos the student was matched in
+Evidence = namedtuple("Evidence", ["distance", "votes"])
+
+
+class AttendanceSession:
+    """
+    Accumulates photos of one class, then logs one roster.
+
+    Photos are identified by a key (e.g. the worker pool's image key), so
+    adding the same photo twice doesn't count it twice.
+    """
+
+    def __init__(self, min_votes=MIN_VOTES):
+        self.id = new_session_id()
+        self.min_votes = min_votes
+        self.roster = set()
+        self.closed = False
+        self._photos = {}     # key -> (encodings, names, distances), in the order they were added
+        self._evidence = {}   # name -> Evidence
+
+    def __len__(self):
+        return len(self._photos)
+
+    def add_photo(self, key, encodings, names, distances, roster):
+        """
+        Adds one photo's faces (parallel lists, as in a PhotoResult). Returns
+        False if the photo is already part of the session.
+        """
+        if self.closed:
+            raise ValueError("This session has already been closed.")
+        if key in self._photos:
+            return False
+        self._photos[key] = (list(encodings), list(names), list(distances))
+        self.roster |= set(roster)
+        self._add_evidence(names, distances)
+        return True
+
+    def photo_keys(self):
+        return list(self._photos)
+
+    def add_result(self, result):
+        """Shortcut for add_photo() with a worker_pool.PhotoResult."""
+        return self.add_photo(result.key, result.encodings, result.names, result.distances, result.roster)
+
+    def rematch(self, matcher, method="greedy"):
+        """
+        Re-fuses every photo against a new gallery (e.g. after a student was
+        enrolled mid-session), re-using the stored encodings: no photo is
+        decoded, detected or encoded again.
+        """
+        self._evidence = {}
+        self.roster = set(matcher.names)
+        for key, (encodings, _, _) in self._photos.items():
+            matches = matcher.assign(encodings, method=method)
+            names = [m.name for m in matches]
+            distances = [m.distance for m in matches]
+            self._photos[key] = (encodings, names, distances)
+            self._add_evidence(names, distances)
+
+    def _add_evidence(self, names, distances):
+        for name, distance in zip(names, distances):
+            if name == UNKNOWN:
+                continue
+            best = self._evidence.get(name)
+            if best is None:
+                self._evidence[name] = Evidence(distance, 1)
+            else:
+                self._evidence[name] = Evidence(min(best.distance, distance), best.votes + 1)
+
+    def evidence(self, name):
+        """The fused Evidence for a student, or None if they weren't found."""
+        return self._evidence.get(name)
+
+    def present(self):
+        return {name for name, e in self._evidence.items() if e.votes >= self.min_votes}
+
+    def statuses(self):
+        """{student: "Present"/"Absent"} for everyone on the roster."""
+        present = self.present()
+        return {s: "Present" if s in present else "Absent" for s in sorted(self.roster)}
+
+    def report(self):
+        """One row per student: name, status, photos found in and best distance."""
+        rows = []
+        for student, status in self.statuses().items():
+            e = self._evidence.get(student)
+            rows.append({
+                "Student Name": student,
+                "Status": status,
+                "Photos": e.votes if e else 0,
+                "Best Distance": round(e.distance, 3) if e else None,
+            })
+        return rows
+
+    def close(self, attendance_log, when=None):
+        """Logs the fused roster once (all rows share the session ID) and returns that ID."""
+        if self.closed:
+            raise ValueError("This session has already been closed.")
+        attendance_log.log_session(self.statuses(), when=when, session_id=self.id)
+        self.closed = True
+        return self.id
@@ -1,31 +1,59 @@
 import streamlit as st
 import os
+import io
 import base64
+import functools
+
+from PIL import Image
 
 # --- CREDENTIALS ---
 USERS = {
     "teacher": "pass123",
     "admin": "admin123"
 }
+# Users who can see admin-only pages (e.g. Metrics)
+ADMINS = {"admin"}
 
-def set_background():
-    """
-    Finds 'background.jpg' in the main folder and sets it as the app background.
-    """
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    bg_image_path = os.path.join(current_dir, "background.jpg")
+# --- BACKGROUND ---
+# The background is resized/recompressed once per process. With Streamlit's
+# static file serving enabled (.streamlit/config.toml) the browser downloads
+# and caches it from /app/static/; otherwise it is inlined as base64 once
+# and the finished CSS string is reused on every rerun.
+BACKGROUND_MAX_WIDTH = 1920
+BACKGROUND_QUALITY = 75
+STATIC_DIR = "static"
 
-    if os.path.exists(bg_image_path):
-        with open(bg_image_path, "rb") as f:
-            data = f.read()
-        
-        bin_str = base64.b64encode(data).decode()
-        
-        # Inject CSS
-        page_bg_img = f"""
+
+def _optimized_background(bg_image_path):
+    """Returns the background as a resized, recompressed JPEG (bytes)."""
+    image = Image.open(bg_image_path).convert("RGB")
+    if image.width > BACKGROUND_MAX_WIDTH:
+        height = round(image.height * BACKGROUND_MAX_WIDTH / image.width)
+        image = image.resize((BACKGROUND_MAX_WIDTH, height), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=BACKGROUND_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+@functools.lru_cache(maxsize=4)
+def _background_css(bg_image_path, mtime_ns, use_static):
+    """Builds the background CSS once per image version (mtime_ns is part of the cache key)."""
+    data = _optimized_background(bg_image_path)
+
+    if use_static:
+        static_dir = os.path.join(os.path.dirname(bg_image_path), STATIC_DIR)
+        os.makedirs(static_dir, exist_ok=True)
+        with open(os.path.join(static_dir, "background.jpg"), "wb") as f:
+            f.write(data)
+        # The version query string makes browsers fetch a replaced image
+        image_url = f"app/static/background.jpg?v={mtime_ns}"
+    else:
+        image_url = "data:image/jpeg;base64," + base64.b64encode(data).decode()
+
+    return f"""
         <style>
         .stApp {{
-            background-image: url("data:image/jpg;base64,{bin_str}");
+            background-image: url("{image_url}");
             background-position: center center;
             background-repeat: no-repeat;
             background-attachment: fixed;
@@ -52,7 +80,19 @@ def set_background():
         }}
         </style>
         """
-        st.markdown(page_bg_img, unsafe_allow_html=True)
+
+
+def set_background():
+    """
+    Finds 'background.jpg' in the main folder and sets it as the app background.
+    """
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    bg_image_path = os.path.join(current_dir, "background.jpg")
+
+    if os.path.exists(bg_image_path):
+        use_static = bool(st.get_option("server.enableStaticServing"))
+        css = _background_css(bg_image_path, os.stat(bg_image_path).st_mtime_ns, use_static)
+        st.markdown(css, unsafe_allow_html=True)
 
 def check_password():
     """Returns `True` if the user had a correct password."""
@@ -68,6 +108,7 @@ def check_password():
     if st.session_state["logged_in"]:
         if st.sidebar.button("🔒 Logout"):
             st.session_state["logged_in"] = False
+            st.session_state.pop("username", None)
             st.rerun()
         return True
 
@@ -81,9 +122,15 @@ def check_password():
     if st.button("Login"):
         if username in USERS and USERS[username] == password:
             st.session_state["logged_in"] = True
+            st.session_state["username"] = username
             st.success("Logged in successfully!")
             st.rerun()
         else:
             st.error("❌ Incorrect ID or Password")
 
-    return False
\ No newline at end of file
+    return False
+
+
+def is_admin():
+    """True if the logged-in user is in ADMINS (call after check_password())."""
+    return st.session_state.get("logged_in", False) and st.session_state.get("username") in ADMINS
@@ -0,0 +1,61 @@
+"""
+Benchmark: per-rerun cost of the page background (auth.set_background).
+
+Compares the old behaviour (read background.jpg, base64 it and rebuild the
+CSS on every rerun) with the memoised CSS, both inlined and served as a
+static file, and prints server time per rerun and bytes sent per rerun.
+
+Usage (from the project folder):
+    python benchmarks/bench_background.py [--reruns 200]
+"""
+import argparse
+import base64
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+import auth
+
+BG_PATH = os.path.join(ROOT, "background.jpg")
+
+
+def old_css():
+    """What set_background() used to do on every rerun."""
+    with open(BG_PATH, "rb") as f:
+        data = f.read()
+    bin_str = base64.b64encode(data).decode()
+    return f'<style>.stApp {{ background-image: url("data:image/jpg;base64,{bin_str}"); }}</style>'
+
+
+def per_rerun(fn, reruns):
+    start = time.perf_counter()
+    for _ in range(reruns):
+        css = fn()
+    return (time.perf_counter() - start) / reruns, len(css.encode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reruns", type=int, default=200)
+    args = parser.parse_args()
+
+    mtime = os.stat(BG_PATH).st_mtime_ns
+    cases = [
+        ("old: re-encode every rerun", old_css),
+        ("new: memoised, inline base64", lambda: auth._background_css(BG_PATH, mtime, False)),
+        ("new: memoised, static file", lambda: auth._background_css(BG_PATH, mtime, True)),
+    ]
+
+    print(f"background.jpg: {os.path.getsize(BG_PATH) / 1024:.0f} KB on disk, "
+          f"{len(auth._optimized_background(BG_PATH)) / 1024:.0f} KB after recompression")
+    print(f"{'':32} {'ms/rerun':>9} {'payload/rerun':>14}")
+    for label, fn in cases:
+        seconds, size = per_rerun(fn, args.reruns)
+        print(f"{label:32} {seconds * 1000:9.3f} {size / 1024:11.1f} KB")
+    print("(the static file itself is downloaded once and then cached by the browser)")
+
+
+if __name__ == "__main__":
+    main()
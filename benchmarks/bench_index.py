@@ -0,0 +1,67 @@
+"""
+Benchmark: recall vs. latency of the approximate IVF index against exact search.
+
+Reports, for every probe setting, how often the IVF index returns the same
+nearest gallery row as brute force (recall@1) and the average time per query
+batch, so an operating point can be picked for a given gallery size.
+
+Usage (from the project folder):
+    python benchmarks/bench_index.py [--gallery 100000] [--faces 50] [--probes 1 2 4 8 16 32]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from face_index import ExactIndex, IVFIndex
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gallery", type=int, default=100000)
+    parser.add_argument("--faces", type=int, default=50, help="faces per query batch (one class photo)")
+    parser.add_argument("--lists", type=int, default=None, help="IVF lists (default 4*sqrt(gallery))")
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Face encodings are not uniform noise: people cluster (age, ethnicity,
+    # lighting...). Model that with a mixture of broad groups.
+    groups = rng.normal(0, 0.15, size=(256, 128))
+    gallery = (groups[rng.integers(0, len(groups), args.gallery)]
+               + rng.normal(0, 0.06, size=(args.gallery, 128))).astype(np.float32)
+    picks = rng.choice(args.gallery, size=args.faces, replace=False)
+    queries = gallery[picks] + rng.normal(0, 0.02, size=(args.faces, 128)).astype(np.float32)
+
+    exact = ExactIndex(gallery)
+    exact_time, (_, truth) = timed(lambda: exact.search(queries, 1), args.repeat)
+
+    start = time.perf_counter()
+    ivf = IVFIndex(gallery, n_lists=args.lists)
+    build_time = time.perf_counter() - start
+
+    print(f"gallery={args.gallery}  faces/batch={args.faces}  ivf lists={ivf.n_lists}  (build {build_time:.2f} s)")
+    print(f"{'index':>12} {'recall@1':>9} {'ms/batch':>9} {'speed-up':>9}")
+    print(f"{'exact':>12} {1.0:9.3f} {exact_time * 1000:9.2f} {1.0:9.1f}")
+    for probes in args.probes:
+        ivf.probes = probes
+        ivf_time, (_, found) = timed(lambda: ivf.search(queries, 1), args.repeat)
+        recall = float(np.mean(found[:, 0] == truth[:, 0]))
+        print(f"{f'ivf/{probes}':>12} {recall:9.3f} {ivf_time * 1000:9.2f} {exact_time / ivf_time:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark: memory and time to decode, colour-convert and annotate one upload.
+
+Compares the old path (full-size decode, a separate RGB copy, boxes drawn
+on the full-size photo) with ingest.py (reduced-size decode, in-place
+colour swap, boxes drawn on a preview), on a synthetic phone photo.
+Face detection is left out: it is the same work in both, on a copy of at
+most recognition.DETECTION_MAX_SIDE.
+
+Usage (from the project folder):
+    python benchmarks/bench_ingest.py [--width 5472 --height 3648] [--faces 40] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import ingest
+
+
+def old_path(image_bytes, boxes, names):
+    """What the worker did before ingest.py."""
+    bgr_img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    rgb_img = cv2.cvtColor(bgr_img, cv2.COLOR_BGR2RGB)
+    for (top, right, bottom, left), name in zip(boxes, names):
+        cv2.rectangle(bgr_img, (left, top), (right, bottom), (0, 255, 0), 2)
+        cv2.putText(bgr_img, name, (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
+    _, jpeg = cv2.imencode(".jpg", bgr_img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return rgb_img.shape, len(jpeg)
+
+
+def new_path(image_bytes, boxes, names):
+    rgb_img, factor = ingest.decode_rgb(image_bytes)
+    reduced = [tuple(v // factor for v in box) for box in boxes]
+    jpeg = ingest.annotate(rgb_img, reduced, names)
+    return rgb_img.shape, len(jpeg)
+
+
+def measure(fn, repeat, *args):
+    best_time, best_mb = float("inf"), float("inf")
+    for _ in range(repeat):
+        with ingest.PeakMemory(enabled=True) as memory:
+            start = time.perf_counter()
+            shape, jpeg_size = fn(*args)
+            elapsed = time.perf_counter() - start
+        best_time, best_mb = min(best_time, elapsed), min(best_mb, memory.mb)
+    return best_time, best_mb, shape, jpeg_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=5472)
+    parser.add_argument("--height", type=int, default=3648)
+    parser.add_argument("--faces", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # A smooth gradient with some noise compresses like a real photo
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:args.height, 0:args.width]
+    photo = np.stack([x * 255 // args.width, y * 255 // args.height, (x + y) % 256], axis=-1).astype(np.uint8)
+    photo = cv2.add(photo, rng.integers(0, 24, size=photo.shape, dtype=np.uint8))
+    del y, x
+    image_bytes = cv2.imencode(".jpg", photo, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+    del photo
+
+    side = min(args.width, args.height) // 12
+    tops = rng.integers(0, args.height - side, args.faces)
+    lefts = rng.integers(0, args.width - side, args.faces)
+    boxes = [(int(t), int(l) + side, int(t) + side, int(l)) for t, l in zip(tops, lefts)]
+    names = [f"Student {i}" for i in range(args.faces)]
+
+    print(f"{args.width}x{args.height} JPEG, {len(image_bytes) / 2 ** 20:.1f} MB, {args.faces} faces")
+    print(f"{'path':>6} {'decoded':>12} {'peak MB':>8} {'ms':>7} {'annotated KB':>13}")
+    for label, fn in (("old", old_path), ("new", new_path)):
+        elapsed, mb, shape, jpeg_size = measure(fn, args.repeat, image_bytes, boxes, names)
+        print(f"{label:>6} {f'{shape[1]}x{shape[0]}':>12} {mb:8.1f} {elapsed * 1000:7.1f} {jpeg_size / 1024:13.0f}")
+
+
+if __name__ == "__main__":
+    main()
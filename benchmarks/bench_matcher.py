@@ -0,0 +1,90 @@
+"""
+Benchmark: batched FaceMatcher vs. the old per-face compare_faces/face_distance loop.
+
+Usage (from the project folder):
+    python benchmarks/bench_matcher.py [--faces 50] [--gallery 10000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from matcher import FaceMatcher, UNKNOWN
+
+try:
+    from face_recognition import compare_faces, face_distance
+except ImportError:
+    # Same code as face_recognition.api, so the benchmark runs without dlib
+    def face_distance(face_encodings, face_to_compare):
+        if len(face_encodings) == 0:
+            return np.empty((0))
+        return np.linalg.norm(face_encodings - face_to_compare, axis=1)
+
+    def compare_faces(known_face_encodings, face_encoding_to_check, tolerance=0.6):
+        return list(face_distance(known_face_encodings, face_encoding_to_check) <= tolerance)
+
+
+def old_loop(known_encodings, known_names, face_encodings):
+    """The loop app.py used to run for every face."""
+    names = []
+    for face_encoding in face_encodings:
+        matches = compare_faces(known_encodings, face_encoding, tolerance=0.6)
+        name = UNKNOWN
+        face_distances = face_distance(known_encodings, face_encoding)
+        best_match_index = np.argmin(face_distances)
+        if matches[best_match_index]:
+            name = known_names[best_match_index]
+        names.append(name)
+    return names
+
+
+def best_of(repeat, fn):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faces", type=int, default=50)
+    parser.add_argument("--gallery", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Real encodings are float64 from dlib; the old code kept them as a Python list
+    gallery = rng.normal(0, 0.1, size=(args.gallery, 128))
+    names = [f"student_{i}" for i in range(args.gallery)]
+    known_encodings = list(gallery)
+
+    # Half the faces are noisy copies of enrolled students, half are strangers
+    picks = rng.choice(args.gallery, size=args.faces // 2, replace=False)
+    faces = np.vstack([
+        gallery[picks] + rng.normal(0, 0.02, size=(len(picks), 128)),
+        rng.normal(0, 0.1, size=(args.faces - len(picks), 128)),
+    ])
+
+    old_time, old_names = best_of(args.repeat, lambda: old_loop(known_encodings, names, list(faces)))
+
+    build_start = time.perf_counter()
+    matcher = FaceMatcher(gallery, names)
+    build_time = time.perf_counter() - build_start
+    new_time, matches = best_of(args.repeat, lambda: matcher.match(faces))
+
+    agree = sum(a == m.name for a, m in zip(old_names, matches))
+    print(f"{args.faces} faces x {args.gallery} enrolled students (best of {args.repeat})")
+    print(f"  old per-face loop : {old_time * 1000:9.2f} ms  ({args.faces / old_time:10.0f} faces/s)")
+    print(f"  FaceMatcher.match : {new_time * 1000:9.2f} ms  ({args.faces / new_time:10.0f} faces/s)")
+    print(f"  matcher build     : {build_time * 1000:9.2f} ms  (once per gallery change)")
+    print(f"  speed-up          : {old_time / new_time:9.1f}x")
+    print(f"  same labels       : {agree}/{args.faces}")
+
+
+if __name__ == "__main__":
+    main()
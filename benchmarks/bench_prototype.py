@@ -0,0 +1,68 @@
+"""
+Benchmark: several photos per student with the prototype index.
+
+Compares one photo per student (the old layout), exact search over every
+photo, and the prototype shortlist with exact re-ranking, on recall@1
+(right student found) and time per query batch.
+
+Usage (from the project folder):
+    python benchmarks/bench_prototype.py [--students 5000] [--photos 5] [--faces 50] [--shortlist 4 8 16 32]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from face_index import ExactIndex, PrototypeIndex
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--photos", type=int, default=5, help="enrollment photos per student")
+    parser.add_argument("--faces", type=int, default=50, help="faces per query batch (one class photo)")
+    parser.add_argument("--noise", type=float, default=0.15, help="pose/lighting spread of each photo")
+    parser.add_argument("--shortlist", type=int, nargs="+", default=[4, 8, 16, 32])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Each student is a point; their photos (and the class photo) scatter
+    # around it with pose/lighting noise comparable to the gap between students
+    students = rng.normal(0, 0.15, size=(args.students, 128))
+    labels = np.repeat(np.arange(args.students), args.photos)
+    gallery = (students[labels] + rng.normal(0, args.noise, size=(len(labels), 128))).astype(np.float32)
+    truth = rng.choice(args.students, size=args.faces, replace=False)
+    queries = (students[truth] + rng.normal(0, args.noise, size=(args.faces, 128))).astype(np.float32)
+
+    print(f"students={args.students}  photos/student={args.photos}  faces/batch={args.faces}")
+    print(f"{'index':>16} {'recall@1':>9} {'ms/batch':>9}")
+
+    one_photo = ExactIndex(gallery[::args.photos])
+    t, (_, found) = timed(lambda: one_photo.search(queries, 1), args.repeat)
+    print(f"{'1 photo, exact':>16} {np.mean(found[:, 0] == truth):9.3f} {t * 1000:9.2f}")
+
+    exact = PrototypeIndex(gallery, labels, shortlist=None)
+    t, (_, found) = timed(lambda: exact.search(queries, 1), args.repeat)
+    print(f"{'all photos':>16} {np.mean(found[:, 0] == truth):9.3f} {t * 1000:9.2f}")
+
+    for shortlist in args.shortlist:
+        index = PrototypeIndex(gallery, labels, shortlist=shortlist)
+        t, (_, found) = timed(lambda: index.search(queries, 1), args.repeat)
+        print(f"{f'prototype/{shortlist}':>16} {np.mean(found[:, 0] == truth):9.3f} {t * 1000:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark: how long each page takes to open in a fresh server process.
+
+Every page is run once (already logged in) with Streamlit's AppTest in its
+own Python process, so nothing is cached from a previous page. Prints the
+time to the first render and which heavy libraries that page pulled in.
+The face models (face_recognition / dlib) should only ever be loaded by the
+recognition workers, never by a page.
+
+Usage (from the project folder):
+    python benchmarks/bench_startup.py [--repeat 3] [pages/2_View_History.py ...]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+HEAVY_MODULES = ["face_recognition", "dlib", "cv2", "scipy", "pandas"]
+
+# Runs inside the child process
+CHILD = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+at.session_state["logged_in"] = True
+at.session_state["username"] = "admin"
+start = time.perf_counter()
+at.run()
+page = time.perf_counter() - start
+print(json.dumps({"page": page, "errors": [e.value for e in at.exception],
+                  "modules": [m for m in sys.argv[2:] if m in sys.modules]}))
+"""
+
+
+def open_page(path):
+    # Output goes to a file, not a pipe: the worker processes app.py starts
+    # (resources.prewarm) inherit stdout, and a pipe would stay open until
+    # they have all exited
+    with tempfile.TemporaryFile("w+") as out:
+        subprocess.run([sys.executable, "-c", CHILD, path] + HEAVY_MODULES, cwd=ROOT,
+                       stdout=out, stderr=subprocess.DEVNULL, check=True)
+        out.seek(0)
+        return json.loads(out.read().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pages", nargs="*", help="default: app.py and everything in pages/")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh processes per page (best is shown)")
+    args = parser.parse_args()
+    pages = args.pages or ["app.py"] + sorted(os.path.join("pages", f) for f in os.listdir(os.path.join(ROOT, "pages"))
+                                              if f.endswith(".py"))
+
+    print(f"{'page':>26} {'first run (s)':>14}  heavy modules loaded")
+    for page in pages:
+        runs = [open_page(page) for _ in range(args.repeat)]
+        best = min(runs, key=lambda r: r["page"])
+        note = f"  ERROR: {best['errors'][0][:60]}" if best["errors"] else ""
+        print(f"{os.path.basename(page):>26} {best['page']:14.2f}  {', '.join(best['modules']) or '-'}{note}")
+
+
+if __name__ == "__main__":
+    main()
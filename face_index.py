@@ -0,0 +1,245 @@
+import numpy as np
+
+# --- CONFIGURATION ---
+# "auto" uses exact search for normal class sizes and switches to the
+# approximate IVF index once the gallery is big enough for it to pay off.
+DEFAULT_INDEX = "auto"
+APPROX_MIN_GALLERY = 50000
+IVF_PROBES = 8             # lists searched per query; higher = better recall, slower
+IVF_TRAIN_ITERATIONS = 10
+IVF_TRAIN_SAMPLES = 64     # training points per list (k-means runs on a sample)
+# With several photos per student, only this many students (closest centroids)
+# are re-ranked against their own photos for each query.
+PROTOTYPE_SHORTLIST = 16
+
+
+def squared_norms(matrix):
+    return np.einsum("ij,ij->i", matrix, matrix)
+
+
+def pairwise_distances(queries, points, point_sq_norms=None):
+    """Euclidean distances between every query and every point, as float32."""
+    if point_sq_norms is None:
+        point_sq_norms = squared_norms(points)
+    dist = queries @ points.T
+    dist *= -2.0
+    dist += squared_norms(queries)[:, None]
+    dist += point_sq_norms[None, :]
+    np.maximum(dist, 0.0, out=dist)   # rounding can push exact matches just below 0
+    return np.sqrt(dist, out=dist)
+
+
+def top_k(dist, k):
+    """Returns (distances, columns) of the k smallest values in each row, sorted."""
+    n_rows, n_cols = dist.shape
+    out_dist = np.full((n_rows, k), np.inf, dtype=np.float32)
+    out_idx = np.full((n_rows, k), -1, dtype=np.int64)
+    kk = min(k, n_cols)
+    if kk == 0:
+        return out_dist, out_idx
+
+    if kk < n_cols:
+        cols = np.argpartition(dist, kk - 1, axis=1)[:, :kk]
+    else:
+        cols = np.tile(np.arange(n_cols), (n_rows, 1))
+    vals = np.take_along_axis(dist, cols, axis=1)
+    order = np.argsort(vals, axis=1)
+    out_dist[:, :kk] = np.take_along_axis(vals, order, axis=1)
+    out_idx[:, :kk] = np.take_along_axis(cols, order, axis=1)
+    return out_dist, out_idx
+
+
+class ExactIndex:
+    """Brute-force search over every gallery row. Always returns the true nearest rows."""
+
+    name = "exact"
+
+    def __init__(self, gallery):
+        self.gallery = np.ascontiguousarray(gallery, dtype=np.float32)
+        self._sq_norms = squared_norms(self.gallery)
+
+    def __len__(self):
+        return len(self.gallery)
+
+    def distances(self, queries):
+        return pairwise_distances(queries, self.gallery, self._sq_norms)
+
+    def search(self, queries, k):
+        """Returns (distances, rows), each (n_queries x k); missing slots are inf / -1."""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.gallery.shape[1])
+        return top_k(self.distances(queries), k)
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate index (pure NumPy).
+
+    The gallery is split into clusters with k-means; a query only scans the
+    rows of its 'probes' closest clusters. Rows are stored grouped by cluster
+    so every probed list is one contiguous slice.
+    """
+
+    name = "ivf"
+
+    def __init__(self, gallery, n_lists=None, probes=IVF_PROBES, seed=0):
+        gallery = np.ascontiguousarray(gallery, dtype=np.float32)
+        n = len(gallery)
+        if n_lists is None:
+            n_lists = int(4 * np.sqrt(n))
+        self.n_lists = max(1, min(n_lists, n))
+        self.probes = probes
+        self.dim = gallery.shape[1]
+
+        self.centroids = self._train(gallery, np.random.default_rng(seed))
+        assignment = self._assign(gallery)
+
+        # Group rows by list: order[i] is the original gallery row of stored row i
+        self.order = np.argsort(assignment, kind="stable")
+        self.gallery = np.ascontiguousarray(gallery[self.order])
+        self._sq_norms = squared_norms(self.gallery)
+        counts = np.bincount(assignment, minlength=self.n_lists)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def __len__(self):
+        return len(self.gallery)
+
+    def _train(self, gallery, rng):
+        """A few rounds of Lloyd's k-means on a random sample of the gallery."""
+        sample_size = min(len(gallery), self.n_lists * IVF_TRAIN_SAMPLES)
+        sample = gallery[rng.choice(len(gallery), size=sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, size=self.n_lists, replace=False)].copy()
+
+        for _ in range(IVF_TRAIN_ITERATIONS):
+            labels = np.argmin(pairwise_distances(sample, centroids), axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=self.n_lists)
+            filled = counts > 0
+            # Empty lists keep their old centroid
+            centroids[filled] = sums[filled] / counts[filled, None]
+        return centroids
+
+    def _assign(self, points, chunk=8192):
+        labels = np.empty(len(points), dtype=np.int64)
+        centroid_norms = squared_norms(self.centroids)
+        for start in range(0, len(points), chunk):
+            block = points[start:start + chunk]
+            labels[start:start + chunk] = np.argmin(pairwise_distances(block, self.centroids, centroid_norms), axis=1)
+        return labels
+
+    def search(self, queries, k):
+        """Returns (distances, rows), each (n_queries x k); missing slots are inf / -1."""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        out_dist = np.full((len(queries), k), np.inf, dtype=np.float32)
+        out_idx = np.full((len(queries), k), -1, dtype=np.int64)
+        if len(queries) == 0 or len(self.gallery) == 0:
+            return out_dist, out_idx
+
+        probes = min(self.probes, self.n_lists)
+        _, probed = top_k(pairwise_distances(queries, self.centroids), probes)
+
+        for q in range(len(queries)):
+            candidates = np.concatenate([
+                np.arange(self.offsets[lst], self.offsets[lst + 1]) for lst in probed[q]
+            ])
+            if len(candidates) == 0:
+                continue
+            dist = pairwise_distances(queries[q:q + 1], self.gallery[candidates], self._sq_norms[candidates])
+            d, cols = top_k(dist, k)
+            found = cols[0] >= 0
+            out_dist[q, found] = d[0, found]
+            out_idx[q, found] = self.order[candidates[cols[0, found]]]
+        return out_dist, out_idx
+
+
+class PrototypeIndex:
+    """
+    Index for galleries with several photos per student.
+
+    Rows are stored grouped by student, and every student also gets a
+    prototype: the mean of their encodings. A query is compared with the
+    prototypes first to shortlist the closest students, then re-ranked
+    exactly against those students' own photos. search() returns students
+    (label numbers), not rows; a student's distance is that of their
+    closest photo. shortlist=None re-ranks every student (exact).
+    """
+
+    name = "prototype"
+
+    def __init__(self, gallery, labels, shortlist=PROTOTYPE_SHORTLIST):
+        gallery = np.ascontiguousarray(gallery, dtype=np.float32)
+        labels = np.asarray(labels, dtype=np.int64)
+        self.dim = gallery.shape[1]
+        self.n_labels = int(labels.max()) + 1 if len(labels) else 0
+        self.shortlist = shortlist
+
+        # Group rows by student: order[i] is the original gallery row of stored row i
+        self.order = np.argsort(labels, kind="stable")
+        self.gallery = np.ascontiguousarray(gallery[self.order])
+        self._sq_norms = squared_norms(self.gallery)
+        counts = np.bincount(labels, minlength=self.n_labels)
+        if len(counts) and counts.min() == 0:
+            raise ValueError("Every label needs at least one gallery row.")
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+        if self.n_labels:
+            sums = np.add.reduceat(self.gallery, self.offsets[:-1], axis=0)
+            self.prototypes = np.ascontiguousarray(sums / counts[:, None], dtype=np.float32)
+        else:
+            self.prototypes = np.zeros((0, self.dim), dtype=np.float32)
+
+    def __len__(self):
+        return self.n_labels
+
+    def search(self, queries, k):
+        """Returns (distances, labels), each (n_queries x k); missing slots are inf / -1."""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        if len(queries) == 0 or self.n_labels == 0:
+            return top_k(np.zeros((len(queries), 0), dtype=np.float32), k)
+
+        if self.shortlist is None or self.shortlist >= self.n_labels:
+            # Small class: every photo, then the closest photo per student
+            dist = pairwise_distances(queries, self.gallery, self._sq_norms)
+            return top_k(np.minimum.reduceat(dist, self.offsets[:-1], axis=1), k)
+
+        _, shortlisted = top_k(pairwise_distances(queries, self.prototypes), self.shortlist)
+
+        # Every (query, shortlisted student, photo) triple as one flat list of
+        # stored rows, laid out student segment by student segment
+        starts = self.offsets[shortlisted].ravel()
+        lengths = self.offsets[shortlisted + 1].ravel() - starts
+        segments = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        rows = np.repeat(starts - segments, lengths) + np.arange(int(lengths.sum()))
+        owner = np.repeat(np.arange(len(queries)).repeat(self.shortlist), lengths)
+
+        sq_dist = np.einsum("ij,ij->i", self.gallery[rows], queries[owner])
+        sq_dist *= -2.0
+        sq_dist += self._sq_norms[rows]
+        sq_dist += squared_norms(queries)[owner]
+        # Closest photo per (query, student), back to a (queries x shortlist) matrix
+        per_student = np.minimum.reduceat(sq_dist, segments).reshape(len(queries), self.shortlist)
+        np.maximum(per_student, 0.0, out=per_student)
+        np.sqrt(per_student, out=per_student)
+
+        out_dist, cols = top_k(per_student, k)
+        out_idx = np.where(cols >= 0, np.take_along_axis(shortlisted, np.maximum(cols, 0), axis=1), -1)
+        return out_dist, out_idx
+
+
+def make_index(gallery, kind=DEFAULT_INDEX, labels=None):
+    """
+    Builds the search index for a gallery matrix ('exact', 'ivf' or 'auto').
+
+    'labels' gives the student number of every row. When some student has
+    more than one row, a PrototypeIndex is used (exact re-ranking of all
+    students for 'exact', a prototype shortlist otherwise).
+    """
+    if labels is not None and len(labels) and int(np.max(labels)) + 1 < len(gallery):
+        return PrototypeIndex(gallery, labels, shortlist=None if kind == "exact" else PROTOTYPE_SHORTLIST)
+    if kind == "auto":
+        kind = "ivf" if len(gallery) >= APPROX_MIN_GALLERY else "exact"
+    if kind == "exact":
+        return ExactIndex(gallery)
+    if kind == "ivf":
+        return IVFIndex(gallery)
+    raise ValueError(f"Unknown index type: {kind}")
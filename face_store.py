@@ -0,0 +1,430 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+from file_locks import file_lock
+
+# --- CONFIGURATION ---
+KNOWN_FACES_DIR = "known_faces"
+STORE_DIRNAME = ".encodings"          # lives inside the known_faces folder
+ENCODINGS_FILE = "encodings.f32"      # raw float32 rows, ENCODING_DIM per row
+INDEX_FILE = "index.json"             # which photo owns which row (and which photos were rejected)
+LOCK_NAME = "store"                   # 'store.lock', held by whichever process is writing the store
+ENCODING_DIM = 128
+IMAGE_EXTENSIONS = (".jpg", ".png", ".jpeg")
+
+
+def file_sha1(path):
+    """Returns the SHA-1 hex digest of a file's contents."""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class FaceStore:
+    """
+    Persistent cache of face encodings for the photos in 'known_faces'.
+
+    A student is either one photo ('known_faces/Jane_Doe.jpg') or a folder
+    of photos ('known_faces/Jane_Doe/*.jpg'); every photo becomes one row,
+    so a student can have several. Every photo is encoded once. The 128-d
+    encodings are kept in a flat float32 file that is memory-mapped at
+    startup, and a small JSON index records the content hash, mtime and
+    size of the photo each row came from. On the next start only new or
+    changed photos are encoded again.
+
+    Several processes can share one store. Writers (the app, server.py, the
+    command line tools) hold an inter-process lock while they sync, enroll
+    or remove. Recognition workers open it with read_only=True: load() then
+    just reads what the writers last saved and never encodes or compacts.
+    Every save bumps a generation number in the index; 'version' is the
+    generation this process last read or wrote, so it names the same
+    gallery in every process, and ensure_loaded() picks up newer saves.
+    """
+
+    def __init__(self, faces_dir=KNOWN_FACES_DIR, read_only=False):
+        self.faces_dir = faces_dir
+        self.read_only = read_only
+        self.store_dir = os.path.join(faces_dir, STORE_DIRNAME)
+        self.encodings = np.zeros((0, ENCODING_DIM), dtype=np.float32)
+        self.names = []
+        self.entries = []
+        self.rejected = []   # photos in 'known_faces' that failed the quality check, with the reasons
+        self.version = 0   # generation of the saved store this gallery matches (see the class docstring)
+        self.loaded = False   # True once load() has run; see ensure_loaded()
+        self._lock = threading.RLock()
+        self._seen_index = None   # (mtime, size, inode) of the index file as we last read or wrote it
+
+    # --- 1. LOW LEVEL FILE HANDLING ---
+    def _encodings_path(self):
+        return os.path.join(self.store_dir, ENCODINGS_FILE)
+
+    def _index_path(self):
+        return os.path.join(self.store_dir, INDEX_FILE)
+
+    def _index_signature(self):
+        try:
+            stat = os.stat(self._index_path())
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _read_index(self):
+        """Returns (entries, rejected, generation) from the index file."""
+        self._seen_index = self._index_signature()
+        try:
+            with open(self._index_path(), "r") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return [], [], 0
+        generation = index.get("generation", 0)
+        if index.get("dim") != ENCODING_DIM:
+            return [], [], generation
+        return index.get("entries", []), index.get("rejected", []), generation
+
+    def _open_rows(self):
+        """Memory-maps the encodings file (read only)."""
+        path = self._encodings_path()
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return np.zeros((0, ENCODING_DIM), dtype=np.float32)
+        rows = os.path.getsize(path) // (4 * ENCODING_DIM)
+        return np.memmap(path, dtype=np.float32, mode="r", shape=(rows, ENCODING_DIM))
+
+    def _store_lock(self):
+        """The inter-process lock around every read-modify-write of the store files."""
+        os.makedirs(self.store_dir, exist_ok=True)
+        return file_lock(os.path.join(self.store_dir, LOCK_NAME))
+
+    def _read_gallery(self):
+        """
+        Returns (entries, rejected, encodings, generation) as currently saved,
+        with one encoding per entry in the same order. Call with the store
+        lock held.
+        """
+        entries, rejected, generation = self._read_index()
+        rows = self._open_rows()
+        entries = [e for e in entries if e.get("row", -1) < len(rows)]
+        order = [e["row"] for e in entries]
+        if order == list(range(len(rows))) and not self.read_only:
+            return entries, rejected, rows, generation   # compact: served straight from the mmap
+        # Copied, so no other process is left holding a mapping of the file
+        rows = np.array(rows[order], dtype=np.float32).reshape(-1, ENCODING_DIM)
+        return entries, rejected, rows, generation
+
+    def _refresh(self):
+        """Re-reads the saved gallery, e.g. after another process changed it. Call with the store lock held."""
+        self.entries, self.rejected, self.encodings, self.version = self._read_gallery()
+        self.names = [e["name"] for e in self.entries]
+
+    def _write_store(self, encodings, entries):
+        """Atomically replaces both store files with a compact copy."""
+        os.makedirs(self.store_dir, exist_ok=True)
+        encodings = np.ascontiguousarray(encodings, dtype=np.float32)
+        for row, entry in enumerate(entries):
+            entry["row"] = row
+
+        tmp_path = self._encodings_path() + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(encodings.tobytes())
+        os.replace(tmp_path, self._encodings_path())
+        self._write_index(entries)
+
+    def _write_index(self, entries):
+        """Saves the index as the next generation. Call with the store lock held, after reading it."""
+        generation = self.version + 1
+        tmp_path = self._index_path() + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"dim": ENCODING_DIM, "generation": generation, "entries": entries,
+                       "rejected": self.rejected}, f)
+        os.replace(tmp_path, self._index_path())
+        self.version = generation
+        self._seen_index = self._index_signature()
+
+    def _list_photos(self):
+        """Photo paths relative to faces_dir: 'Name.jpg' and 'Name/anything.jpg'."""
+        if not os.path.exists(self.faces_dir):
+            os.makedirs(self.faces_dir)
+            return []
+        photos = []
+        for item in os.listdir(self.faces_dir):
+            path = os.path.join(self.faces_dir, item)
+            if os.path.isdir(path):
+                if not item.startswith("."):   # skip our own .encodings folder
+                    photos.extend(f"{item}/{f}" for f in os.listdir(path) if f.lower().endswith(IMAGE_EXTENSIONS))
+            elif item.lower().endswith(IMAGE_EXTENSIONS):
+                photos.append(item)
+        return sorted(photos)
+
+    @staticmethod
+    def file_stem(name):
+        """
+        Turns a student name into the name used for their photo/folder.
+
+        Spaces become underscores ("John Doe" -> "John_Doe"). Raises
+        ValueError for names that can't be a single file name inside
+        'known_faces' (empty, path separators, "..", or a leading dot).
+        """
+        stem = name.strip().replace(" ", "_") if isinstance(name, str) else ""
+        if not stem:
+            raise ValueError("The student name is empty.")
+        if "/" in stem or "\\" in stem or ".." in stem or stem.startswith("."):
+            raise ValueError(f"'{name}' can't be used as a student name (no '/', '\\', '..' or leading '.').")
+        return stem
+
+    @staticmethod
+    def _student_name(relpath):
+        """'Jane_Doe.jpg' and 'Jane_Doe/2.jpg' both belong to 'Jane_Doe'."""
+        folder, _, filename = relpath.rpartition("/")
+        return folder or os.path.splitext(filename)[0]
+
+    def list_students(self):
+        """Every student with a photo in 'known_faces' (files and folders), without loading the store."""
+        return sorted({self._student_name(f) for f in self._list_photos()})
+
+    # --- 2. ENCODING ---
+    def _encode_file(self, filepath):
+        """Returns (encoding, problems); encoding is None if the photo isn't usable."""
+        import quality   # pulls in cv2 and the face models, only needed when there is something to encode
+        try:
+            with Image.open(filepath) as img:
+                image = np.array(img.convert("RGB"))
+        except (OSError, ValueError) as e:
+            # Unreadable or truncated file: rejected like a photo without a face
+            return None, [f"The file could not be read as an image ({e})."]
+        report = quality.check_photo(image, strict=False)
+        return report.encoding, report.problems
+
+    # --- 3. STARTUP SYNC ---
+    def load(self):
+        """
+        Brings the store up to date with the 'known_faces' folder and loads it.
+
+        Photos whose mtime and size match the index reuse their stored row.
+        A photo that was touched or renamed but whose content hash is already
+        known also reuses its row; only genuinely new photos are encoded.
+        Photos without exactly one face are remembered in self.rejected (by
+        the same mtime/size/hash keys) and skipped without being decoded
+        again until the file changes. When nothing changed the encodings are
+        served straight from the mmap.
+
+        With read_only=True it only reads the saved store (see the class
+        docstring).
+        """
+        if self.read_only:
+            with self._lock, self._store_lock():
+                self._refresh()
+                self.loaded = True
+                return self
+
+        with self._lock, self._store_lock():
+            old_entries, old_rejected, self.version = self._read_index()
+            rows = self._open_rows()
+            old_entries = [e for e in old_entries if e.get("row", -1) < len(rows)]
+            by_file = {e["file"]: e for e in old_entries}
+            by_hash = {e["sha1"]: e for e in old_entries}
+            rejected_by_file = {r["file"]: r for r in old_rejected}
+            rejected_by_hash = {r["sha1"]: r for r in old_rejected}
+
+            new_entries = []
+            new_rows = []
+            new_rejected = []
+            changed = False
+
+            for filename in self._list_photos():
+                filepath = os.path.join(self.faces_dir, *filename.split("/"))
+                stat = os.stat(filepath)
+                entry = by_file.get(filename)
+
+                if entry is not None and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                    new_entries.append(entry)
+                    new_rows.append(rows[entry["row"]])
+                    continue
+
+                bad = rejected_by_file.get(filename)
+                if bad is not None and bad["mtime_ns"] == stat.st_mtime_ns and bad["size"] == stat.st_size:
+                    new_rejected.append(bad)
+                    continue
+
+                sha1 = file_sha1(filepath)
+                known = by_hash.get(sha1)
+                if known is not None:
+                    encoding = rows[known["row"]]
+                else:
+                    bad = rejected_by_hash.get(sha1)
+                    problems = bad["problems"] if bad is not None else None
+                    if problems is None:
+                        encoding, problems = self._encode_file(filepath)
+                    if problems:
+                        new_rejected.append({
+                            "file": filename,
+                            "sha1": sha1,
+                            "mtime_ns": stat.st_mtime_ns,
+                            "size": stat.st_size,
+                            "problems": problems,
+                        })
+                        continue
+
+                new_entries.append({
+                    "file": filename,
+                    "name": self._student_name(filename),
+                    "sha1": sha1,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "size": stat.st_size,
+                })
+                new_rows.append(encoding)
+                changed = True
+
+            self.rejected = new_rejected
+            unchanged_layout = [e.get("row") for e in new_entries] == list(range(len(rows)))
+            if changed or not unchanged_layout:
+                matrix = np.array(new_rows, dtype=np.float32).reshape(-1, ENCODING_DIM)
+                # Drop every view of the old mmap first, Windows can't replace a mapped file
+                del rows, new_rows
+                self.encodings = matrix
+                self._write_store(matrix, [dict(e) for e in new_entries])
+                rows = self._open_rows()
+                new_entries, _, _ = self._read_index()
+            elif new_rejected != old_rejected:
+                self._write_index(new_entries)
+
+            self.encodings = rows
+            self.entries = new_entries
+            self.names = [e["name"] for e in new_entries]
+            self.loaded = True
+            return self
+
+    def ensure_loaded(self):
+        """
+        Runs load() the first time it is called. Later calls only re-read the
+        saved store if another process (server.py, the app, a command line
+        tool) has saved it since, which costs one stat() when nothing changed.
+        """
+        with self._lock:
+            if not self.loaded:
+                return self.load()
+            if self._index_signature() != self._seen_index:
+                with self._store_lock():
+                    self._refresh()
+            return self
+
+    def snapshot(self):
+        """Returns a consistent (encodings, names, version) view of the gallery."""
+        with self._lock:
+            return self.encodings, list(self.names), self.version
+
+    # --- 4. ENROLLMENT (one student at a time) ---
+    def enroll(self, name, rgb_image, replace=True):
+        """
+        Adds or replaces a single student.
+
+        The photo is encoded once, saved to 'known_faces' and its encoding is
+        appended to both the in-memory gallery and the on-disk store, so the
+        rest of the roster is never re-encoded. With replace=False the photo
+        is added to the student's folder ('known_faces/<name>/') as an extra
+        sample and their existing photos are kept. Raises quality.PhotoRejected
+        (a ValueError) when the photo fails the quality check, and ValueError
+        for a name that isn't a valid file name (see file_stem()), before
+        anything is written.
+        """
+        if self.read_only:
+            raise RuntimeError("This FaceStore was opened read-only.")
+        stem = self.file_stem(name)
+        import quality
+        report = quality.check_photo(rgb_image)
+        if report.problems:
+            raise quality.PhotoRejected(report.problems)
+        encoding = report.encoding
+
+        with self._lock, self._store_lock():
+            # Another process may have enrolled or compacted the store since we
+            # loaded it, so start from what is saved now, not our old row numbers
+            self._refresh()
+            if replace:
+                self._drop_entries(stem, delete_files=True)
+                filename = stem + ".jpg"
+            else:
+                os.makedirs(os.path.join(self.faces_dir, stem), exist_ok=True)
+                number = 1
+                while os.path.exists(os.path.join(self.faces_dir, stem, f"{number:03d}.jpg")):
+                    number += 1
+                filename = f"{stem}/{number:03d}.jpg"
+
+            filepath = os.path.join(self.faces_dir, *filename.split("/"))
+            os.makedirs(self.faces_dir, exist_ok=True)
+            Image.fromarray(rgb_image).save(filepath, "JPEG", quality=95)
+            stat = os.stat(filepath)
+
+            # Append the new row at the end of the encodings file
+            os.makedirs(self.store_dir, exist_ok=True)
+            with open(self._encodings_path(), "ab") as f:
+                row = f.tell() // (4 * ENCODING_DIM)
+                f.write(encoding.tobytes())
+
+            entry = {
+                "file": filename,
+                "name": stem,
+                "sha1": file_sha1(filepath),
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "row": row,
+            }
+            self.entries = self.entries + [entry]
+            self.rejected = [r for r in self.rejected if r["file"] != filename]
+            self._write_index(self.entries)
+
+            self.encodings = np.vstack([self.encodings, encoding[None, :]])
+            self.names = self.names + [stem]
+            return stem
+
+    def update(self, name, rgb_image):
+        """Replaces all of a student's photos and encodings with this one (same as enrolling again)."""
+        return self.enroll(name, rgb_image)
+
+    def add_photo(self, name, rgb_image):
+        """Adds one more photo of a student (or enrolls them if they are new)."""
+        return self.enroll(name, rgb_image, replace=False)
+
+    def remove(self, name):
+        """Deletes all of a student's photos and encodings. Returns True if they existed."""
+        if self.read_only:
+            raise RuntimeError("This FaceStore was opened read-only.")
+        stem = self.file_stem(name)
+        with self._lock, self._store_lock():
+            self._refresh()
+            removed = self._drop_entries(stem, delete_files=True)
+            if removed:
+                self._write_index(self.entries)
+            return removed
+
+    def _drop_entries(self, stem, delete_files):
+        """
+        Removes every entry for a student from the in-memory gallery.
+
+        The rows they used in the encodings file are simply left unreferenced;
+        the next load() compacts the file.
+        """
+        keep = [i for i, e in enumerate(self.entries) if e["name"] != stem]
+        if len(keep) == len(self.entries):
+            return False
+
+        if delete_files:
+            rejected = [r for r in self.rejected if self._student_name(r["file"]) == stem]
+            for e in [e for e in self.entries if e["name"] == stem] + rejected:
+                filepath = os.path.join(self.faces_dir, *e["file"].split("/"))
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+            self.rejected = [r for r in self.rejected if r not in rejected]
+            folder = os.path.join(self.faces_dir, stem)
+            if os.path.isdir(folder) and not os.listdir(folder):
+                os.rmdir(folder)
+
+        self.entries = [self.entries[i] for i in keep]
+        self.names = [self.names[i] for i in keep]
+        self.encodings = np.ascontiguousarray(self.encodings[keep], dtype=np.float32)
+        return True
@@ -0,0 +1,206 @@
+"""
+Turns uploaded image bytes into pixels without holding more than we need.
+
+A 20 MP phone photo is ~60 MB once decoded, and the old path kept three
+full-size copies per request (BGR, RGB and the annotated BGR). Here:
+  - JPEGs are decoded at 1/2, 1/4 or 1/8 size straight from the file (the
+    size is read from the header first), so nothing bigger than
+    MAX_DECODE_SIDE is ever allocated;
+  - the BGR -> RGB swap is done in place, in the decoded buffer;
+  - boxes and names are drawn on a small preview, not on the full photo;
+  - PeakMemory measures how much memory one request needed at its peak
+    (opt-in and sampled, see TRACE_MEMORY_EVERY).
+"""
+import io
+import os
+import tracemalloc
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from matcher import UNKNOWN
+
+# --- CONFIGURATION ---
+# Longest side a photo is decoded at. Detection already works on a copy of
+# at most recognition.DETECTION_MAX_SIDE, and faces this far apart still
+# encode well, so bigger photos only cost memory.
+MAX_DECODE_SIDE = 3000
+# Cap for photos that get tiled detection instead (worker_pool.TILE_WHEN_IDLE):
+# tiles are detected at full resolution, which is what finds the small faces
+# at the back of an auditorium, so these are decoded (nearly) in full.
+TILED_MAX_DECODE_SIDE = 6000
+PREVIEW_MAX_SIDE = 1280   # longest side of the annotated image shown to the user
+# Measuring memory (tracemalloc) slows down every allocation while it runs, so
+# it is off by default. SMART_ATTENDANCE_TRACE_MEMORY=N measures every Nth
+# photo in each worker (1 = every photo, 0 = none).
+TRACE_MEMORY_EVERY = int(os.environ.get("SMART_ATTENDANCE_TRACE_MEMORY", "0") or 0)
+
+# Reduced decoding: OpenCV scales JPEGs down while decoding (other formats
+# are decoded in full and shrunk straight away)
+_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+_photos_seen = 0   # per process, for TRACE_MEMORY_EVERY
+
+# Reused between photos with the same preview size (one per process; the
+# worker processes handle one photo at a time)
+_preview_buffer = None
+
+
+# --- 1. DECODING ---
+def _jpeg_size(image_bytes):
+    """(width, height) from a JPEG's start-of-frame marker, or None if it isn't a JPEG."""
+    data = memoryview(image_bytes)
+    if data[:2] != b"\xff\xd8":
+        return None
+    i = 2
+    while i + 4 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:                       # padding between markers
+            i += 1
+        elif marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            i += 2                               # markers without a length
+        elif 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            if i + 9 > len(data):
+                return None
+            height = int.from_bytes(data[i + 5:i + 7], "big")
+            width = int.from_bytes(data[i + 7:i + 9], "big")
+            return (width, height) if width and height else None
+        else:
+            i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    return None
+
+
+def image_size(image_bytes):
+    """Returns (width, height) from the image header, without decoding it (None if unknown)."""
+    # Read straight from the JPEG header: Pillow refuses to even open photos
+    # over Image.MAX_IMAGE_PIXELS, and those are the ones we must shrink most
+    size = _jpeg_size(image_bytes)
+    if size is not None:
+        return size
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            return img.size
+    except Exception:
+        return None
+
+
+def decode_factor(size, max_side=MAX_DECODE_SIDE):
+    """The smallest of 1, 2, 4, 8 that brings the longest side down to 'max_side'."""
+    if size is None or not max_side:
+        return 1
+    for factor in (1, 2, 4):
+        if max(size) / factor <= max_side:
+            return factor
+    return 8
+
+
+def decode_rgb(image_bytes, max_side=MAX_DECODE_SIDE):
+    """
+    Decodes an uploaded photo to an RGB array and returns (rgb, factor):
+    the photo is 'factor' times smaller than the original on each side.
+    Raises ValueError for photos whose size can't be read from the header
+    (so it can't be capped) or that are too big even at 1/8 size.
+    """
+    size = image_size(image_bytes)
+    if size is None:
+        raise ValueError("Could not read the image (not a photo, or far too large).")
+    factor = decode_factor(size, max_side)
+    if max_side and max(size) / factor > 2 * max_side:
+        raise ValueError(f"The photo is too large ({size[0]}x{size[1]} pixels).")
+    # np.frombuffer shares the upload's memory instead of copying it
+    img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), _DECODE_FLAGS[factor])
+    if img is None:
+        raise ValueError("Could not read the image.")
+    # Swap the channels in place rather than into a second full-size array.
+    # (A reversed view, img[..., ::-1], would be free, but dlib rejects arrays
+    # with negative strides and would copy it anyway.)
+    cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=img)
+    return img, factor
+
+
+def scale_boxes(boxes, factor):
+    """Maps (top, right, bottom, left) boxes from a reduced decode back to the original photo."""
+    return [tuple(int(v) * factor for v in box) for box in boxes]
+
+
+# --- 2. ANNOTATED PREVIEW ---
+def preview(rgb_img, max_side=PREVIEW_MAX_SIDE):
+    """Returns (bgr, scale): a copy no bigger than 'max_side', ready to draw on and encode."""
+    global _preview_buffer
+    height, width = rgb_img.shape[:2]
+    scale = min(1.0, max_side / max(height, width))
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    if _preview_buffer is None or _preview_buffer.shape[:2] != (size[1], size[0]):
+        _preview_buffer = np.empty((size[1], size[0], 3), dtype=np.uint8)
+    cv2.resize(rgb_img, size, dst=_preview_buffer, interpolation=cv2.INTER_AREA)
+    cv2.cvtColor(_preview_buffer, cv2.COLOR_RGB2BGR, dst=_preview_buffer)
+    return _preview_buffer, scale
+
+
+def annotate(rgb_img, boxes, names, jpeg_quality=90, max_side=PREVIEW_MAX_SIDE):
+    """Draws the boxes and names on a preview of the photo and returns it as JPEG bytes."""
+    bgr, scale = preview(rgb_img, max_side)
+    for (top, right, bottom, left), name in zip(boxes, names):
+        top, right, bottom, left = (int(round(v * scale)) for v in (top, right, bottom, left))
+        color = (0, 255, 0) if name != UNKNOWN else (0, 0, 255)
+        cv2.rectangle(bgr, (left, top), (right, bottom), color, 2)
+        cv2.putText(bgr, name, (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
+    _, jpeg = cv2.imencode(".jpg", bgr, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+    return jpeg.tobytes()
+
+
+# --- 3. MEMORY MEASUREMENT ---
+class PeakMemory:
+    """
+    Measures the most memory a block of code needed on top of what was
+    already in use:
+
+        with PeakMemory() as mem:
+            ...
+        mem.mb   # None if this block wasn't measured
+
+    By default only every TRACE_MEMORY_EVERY-th block in the process is
+    measured; tracing is switched on just for that block. Counts Python
+    objects and numpy/OpenCV arrays (everything tracemalloc sees), not
+    dlib's internal buffers.
+    """
+
+    def __init__(self, enabled=None):
+        self.enabled = _sample() if enabled is None else enabled
+        self.mb = None
+        self._baseline = 0
+        self._started = False
+
+    def __enter__(self):
+        if self.enabled:
+            self._started = not tracemalloc.is_tracing()
+            if self._started:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._baseline = tracemalloc.get_traced_memory()[0]
+        return self
+
+    def __exit__(self, *exc):
+        if self.enabled:
+            peak = tracemalloc.get_traced_memory()[1]
+            self.mb = max(0, peak - self._baseline) / 2 ** 20
+            if self._started:
+                tracemalloc.stop()
+        return False
+
+
+def _sample():
+    """True for every TRACE_MEMORY_EVERY-th call in this process (starting with the first)."""
+    global _photos_seen
+    if TRACE_MEMORY_EVERY <= 0:
+        return False
+    _photos_seen += 1
+    return (_photos_seen - 1) % TRACE_MEMORY_EVERY == 0
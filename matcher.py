@@ -0,0 +1,170 @@
+import collections
+import functools
+
+import numpy as np
+
+from face_index import DEFAULT_INDEX, make_index, pairwise_distances
+
+# --- CONFIGURATION ---
+DEFAULT_TOLERANCE = 0.6   # same threshold face_recognition.compare_faces uses
+UNKNOWN = "Unknown"
+ASSIGN_CANDIDATES = 5     # nearest students considered per face in assign()
+
+# One result per detected face.
+#   name     -> best matching student, or "Unknown" if above the tolerance
+#   index    -> position of that student in FaceMatcher.names (-1 if the gallery is empty)
+#   distance -> euclidean distance to the best match (their closest photo)
+#   margin   -> how much closer the best match is than the runner-up
+Match = collections.namedtuple("Match", ["name", "index", "distance", "margin"])
+
+
+@functools.lru_cache(maxsize=None)
+def _linear_sum_assignment():
+    """scipy's solver, imported the first time "hungarian" is used (importing scipy is slow)."""
+    try:
+        from scipy.optimize import linear_sum_assignment
+    except ImportError:  # scipy is optional, assign() falls back to greedy
+        return None
+    return linear_sum_assignment
+
+
+class FaceMatcher:
+    """
+    Matches face encodings against the whole gallery in one batched operation.
+
+    The gallery is kept as a single contiguous float32 matrix with one row
+    per enrollment photo; 'names' gives the student of every row and a
+    student may have several. Everything the matcher returns is per
+    student: self.names lists each student once, and a student's distance
+    is that of their closest photo. Lookups go through a pluggable index
+    (see face_index.py): exact brute-force search by default, an approximate
+    IVF index for very large galleries, or a prototype index when students
+    have several photos.
+    """
+
+    def __init__(self, encodings, names, tolerance=DEFAULT_TOLERANCE, index=DEFAULT_INDEX):
+        self.gallery = np.ascontiguousarray(encodings, dtype=np.float32)
+        if self.gallery.ndim != 2:
+            self.gallery = self.gallery.reshape(len(names), -1)
+        # Student number of every gallery row, in order of first appearance
+        numbers = {}
+        self.labels = np.array([numbers.setdefault(name, len(numbers)) for name in names], dtype=np.int64)
+        self.names = list(numbers)
+        self.tolerance = tolerance
+        self.index = make_index(self.gallery, index, self.labels) if isinstance(index, str) else index
+
+    def __len__(self):
+        return len(self.names)
+
+    def distances(self, face_encodings):
+        """Returns the full (faces x students) matrix of euclidean distances."""
+        faces = np.asarray(face_encodings, dtype=np.float32).reshape(-1, self.gallery.shape[1])
+        dist = pairwise_distances(faces, self.gallery)
+        if len(self.names) == len(self.gallery):
+            return dist
+        # Several photos per student: keep the closest one
+        per_student = np.full((len(self.names), len(faces)), np.inf, dtype=np.float32)
+        np.minimum.at(per_student, self.labels, dist.T)
+        return per_student.T
+
+    def match(self, face_encodings):
+        """Returns one Match per face encoding, in the same order."""
+        n_faces = len(face_encodings)
+        if n_faces == 0:
+            return []
+        if len(self.names) == 0:
+            return [Match(UNKNOWN, -1, float("inf"), float("inf"))] * n_faces
+
+        # Best and runner-up student for every face
+        dist, rows = self.index.search(face_encodings, 2)
+
+        results = []
+        for i in range(n_faces):
+            index = int(rows[i, 0])
+            distance = float(dist[i, 0])
+            if index < 0:
+                # An approximate index can come back empty-handed
+                results.append(Match(UNKNOWN, -1, float("inf"), float("inf")))
+                continue
+            name = self.names[index] if distance <= self.tolerance else UNKNOWN
+            results.append(Match(name, index, distance, float(dist[i, 1]) - distance))
+        return results
+
+    def assign(self, face_encodings, method="greedy"):
+        """
+        Like match(), but solves the whole photo jointly so that every student
+        is given to at most one face.
+
+        method="greedy" claims (face, student) pairs in order of increasing
+        distance and skips pairs whose face or student is already taken.
+        method="hungarian" minimises the total distance (needs scipy, falls
+        back to greedy without it). Only pairs within the tolerance are used.
+        """
+        n_faces = len(face_encodings)
+        if n_faces == 0:
+            return []
+        if len(self.names) == 0:
+            return [Match(UNKNOWN, -1, float("inf"), float("inf"))] * n_faces
+
+        k = min(ASSIGN_CANDIDATES, len(self.names))
+        dist, rows = self.index.search(face_encodings, k)
+
+        if method == "hungarian" and _linear_sum_assignment() is not None:
+            chosen = self._assign_hungarian(dist, rows)
+        elif method in ("greedy", "hungarian"):
+            chosen = self._assign_greedy(dist, rows)
+        else:
+            raise ValueError(f"Unknown assignment method: {method}")
+
+        results = []
+        for i in range(n_faces):
+            slot = chosen.get(i)
+            if slot is None:
+                # No free student within the tolerance; report the nearest one anyway
+                index, distance = int(rows[i, 0]), float(dist[i, 0])
+                margin = float(dist[i, 1]) - distance if k > 1 else float("inf")
+                results.append(Match(UNKNOWN, index, distance, margin))
+                continue
+            index, distance = int(rows[i, slot]), float(dist[i, slot])
+            others = np.delete(dist[i], slot)
+            margin = float(others.min()) - distance if len(others) else float("inf")
+            results.append(Match(self.names[index], index, distance, margin))
+        return results
+
+    def _assign_greedy(self, dist, rows):
+        """Returns {face: candidate slot}, claiming the closest pairs first."""
+        faces, slots = np.nonzero((dist <= self.tolerance) & (rows >= 0))
+        order = np.argsort(dist[faces, slots], kind="stable")
+
+        chosen = {}
+        taken = set()
+        for face, slot in zip(faces[order], slots[order]):
+            if len(chosen) == len(dist):
+                break
+            row = rows[face, slot]
+            if face in chosen or row in taken:
+                continue
+            chosen[int(face)] = int(slot)
+            taken.add(row)
+        return chosen
+
+    def _assign_hungarian(self, dist, rows):
+        """Returns {face: candidate slot} with the minimum total distance."""
+        students = np.unique(rows[rows >= 0])
+        column = {int(row): c for c, row in enumerate(students)}
+
+        # Pairs outside the candidate lists or above the tolerance get a cost
+        # no real pair can reach, and are dropped after solving
+        too_far = self.tolerance * 10 + 1
+        cost = np.full((len(dist), len(students)), too_far, dtype=np.float64)
+        for face in range(len(dist)):
+            for slot, row in enumerate(rows[face]):
+                if row >= 0 and dist[face, slot] <= self.tolerance:
+                    cost[face, column[int(row)]] = dist[face, slot]
+
+        chosen = {}
+        for face, col in zip(*_linear_sum_assignment()(cost)):
+            if cost[face, col] < too_far:
+                slot = int(np.nonzero(rows[face] == students[col])[0][0])
+                chosen[int(face)] = slot
+        return chosen
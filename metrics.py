@@ -0,0 +1,142 @@
+"""
+In-process metrics for the recognition pipeline.
+
+Every stage time that passes through the app, the worker pool or the HTTP
+API is added to a latency histogram (in milliseconds, named "stage.<stage>"
+or "http.<path>"), next to faces-per-image and peak-memory-per-photo (MB)
+histograms, counters (photos, failures, cache hits, full-queue rejections)
+and gauges (gallery size, queued jobs). View them on the Metrics page,
+GET /metrics on server.py, or dump them as JSON.
+
+Set SMART_ATTENDANCE_METRICS=0 to switch recording off: every function
+below then returns straight away without taking the lock or allocating.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+
+# --- CONFIGURATION ---
+ENABLED = os.environ.get("SMART_ATTENDANCE_METRICS", "1") != "0"
+# Histogram bucket upper bounds in ms (anything slower lands in the last, open bucket)
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+
+class Histogram:
+    """Counts observations per bucket, plus count/sum/min/max."""
+
+    def __init__(self, bounds=BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, q):
+        """Estimated q-th percentile (0-100): the upper bound of the bucket it falls in."""
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for bound, n in zip(self.bounds + (self.max,), self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "buckets": dict(zip([str(b) for b in self.bounds] + ["+inf"], self.counts)),
+        }
+
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_gauges = {}
+_started = time.time()
+
+
+def set_enabled(flag):
+    """Turns recording on or off for this process."""
+    global ENABLED
+    ENABLED = bool(flag)
+
+
+def observe(name, value):
+    """Adds one value (e.g. milliseconds) to the histogram 'name'."""
+    if not ENABLED:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(value)
+
+
+def record_timings(timings, prefix="stage"):
+    """Records a {stage: seconds} dict (as returned by recognition.recognize()) in ms."""
+    if not ENABLED:
+        return
+    for stage, seconds in timings.items():
+        observe(f"{prefix}.{stage}", seconds * 1000)
+
+
+def count(name, n=1):
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def set_gauge(name, value):
+    if not ENABLED:
+        return
+    with _lock:
+        _gauges[name] = value
+
+
+def snapshot():
+    """Everything recorded so far, as plain JSON-friendly dicts."""
+    with _lock:
+        return {
+            "enabled": ENABLED,
+            "uptime_s": round(time.time() - _started, 1),
+            "histograms": {name: h.to_dict() for name, h in sorted(_histograms.items())},
+            "counters": dict(sorted(_counters.items())),
+            "gauges": dict(sorted(_gauges.items())),
+        }
+
+
+def dump_json(path=None):
+    """Returns the snapshot as a JSON string and, if 'path' is given, writes it there too."""
+    text = json.dumps(snapshot(), indent=2)
+    if path:
+        with open(path, "w") as f:
+            f.write(text)
+    return text
+
+
+def reset():
+    global _started
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _gauges.clear()
+        _started = time.time()
@@ -1,19 +1,28 @@
 import streamlit as st
-import pandas as pd
-import os
 import auth # <--- Import auth
+from attendance_log import get_attendance_log, summarize_daily
 
 # --- LOGIN CHECK ---
 if not auth.check_password():
     st.stop()
 # --- CONFIGURATION ---
-ATTENDANCE_FILE = "attendance_log.csv"
+# CSV or SQLite, depending on ATTENDANCE_BACKEND (see attendance_log.py)
+attendance_log = get_attendance_log()
+
+# --- CACHED SUMMARY ---
+# Built from the per-student-per-day rollup, not the raw log, and cached per
+# (students, date range). 'version' changes on every new write, which
+# invalidates the cached entries.
+@st.cache_data(max_entries=64, show_spinner=False)
+def load_summary(location, students, start_date, end_date, version):
+    daily = attendance_log.daily_summary(list(students), start_date, end_date)
+    return summarize_daily(daily)
 
 st.set_page_config(layout="wide")
 st.title("📅 Attendance History")
 
 # --- Check if the log file exists ---
-if not os.path.exists(ATTENDANCE_FILE):
+if not attendance_log.exists():
     st.error("No attendance has been logged yet. Take attendance from the main page first.")
 else:
     # --- Load the data ---
@@ -21,11 +30,6 @@ else:
     if st.button("🔄 Refresh Data"):
         pass # Just re-runs the script
 
-    df = pd.read_csv(ATTENDANCE_FILE)
-    
-    # Make sure 'Date' is a proper datetime object for filtering
-    df['Date'] = pd.to_datetime(df['Date'])
-
     st.write("Here is the complete attendance log. Use the filters below to analyze it.")
 
     # --- 1. FILTERS ---
@@ -36,13 +40,12 @@ else:
 
     with col1:
         # Filter by Student Name (allow selecting multiple)
-        all_students = sorted(df['Name'].unique())
+        all_students = attendance_log.students()
         selected_students = st.multiselect("Select Students", all_students, default=all_students)
 
     with col2:
         # Filter by Date Range
-        min_date = df['Date'].min()
-        max_date = df['Date'].max()
+        min_date, max_date = attendance_log.date_range()
         selected_date_range = st.date_input(
             "Select Date Range",
             value=(min_date, max_date),
@@ -56,12 +59,8 @@ else:
     if len(selected_date_range) == 2:
         start_date, end_date = selected_date_range
         
-        # Filter the dataframe
-        filtered_df = df[
-            (df['Name'].isin(selected_students)) &
-            (df['Date'] >= pd.to_datetime(start_date)) &
-            (df['Date'] <= pd.to_datetime(end_date))
-        ]
+        # Only load the rows we need (with SQLite this is an indexed range query)
+        filtered_df = attendance_log.query(selected_students, start_date, end_date)
 
         # --- 3. DISPLAY RESULTS ---
         st.subheader("Filtered Attendance Data")
@@ -70,14 +69,9 @@ else:
         st.subheader("Attendance Summary")
         
         if not filtered_df.empty:
-            # Calculate total days attended for each selected student
-            summary = filtered_df[filtered_df['Status'] == 'Present'].groupby('Name').size().reset_index(name='Total Days Present')
-            
-            # Calculate total unique days in the log for the selected range
-            total_days_logged = filtered_df['Date'].nunique()
-            summary['Total Days Logged'] = total_days_logged
-            
-            summary['Attendance Percentage'] = ((summary['Total Days Present'] / summary['Total Days Logged']) * 100).round(1)
+            # Days present per student and unique days logged in the selected range
+            summary = load_summary(attendance_log.location, tuple(selected_students),
+                                   start_date, end_date, attendance_log.version())
             
             st.dataframe(summary.set_index('Name'))
             
@@ -1,17 +1,14 @@
 import streamlit as st
-import cv2
-import numpy as np
-import os
 
 import auth # <--- Import auth
+import ingest
+import quality
+import resources
 
 # --- LOGIN CHECK ---
 if not auth.check_password():
     st.stop()
 
-# --- CONFIGURATION ---
-KNOWN_FACES_DIR = "known_faces"
-
 st.set_page_config(page_title="Add Student", page_icon="➕")
 st.title("➕ Add New Student")
 
@@ -19,6 +16,8 @@ st.write("Use this page to add a new student to the database.")
 
 # --- INPUTS ---
 student_name = st.text_input("Enter Student Name")
+# Extra photos (different angles, glasses, lighting) make recognition more reliable
+add_extra = st.checkbox("Add as an extra photo (keep this student's existing photos)")
 input_method = st.radio("Choose Input Method", ["Camera", "Upload File"], horizontal=True)
 
 img_buffer = None
@@ -36,27 +35,43 @@ if st.button("Save Student to Database"):
         st.error("❌ Please take a photo or upload a file.")
     else:
         try:
-            # 1. Convert the uploaded/captured file to an OpenCV image
-            bytes_data = img_buffer.getvalue()
-            cv2_img = cv2.imdecode(np.frombuffer(bytes_data, np.uint8), cv2.IMREAD_COLOR)
-
-            # 2. Check if the folder exists (just in case)
-            if not os.path.exists(KNOWN_FACES_DIR):
-                os.makedirs(KNOWN_FACES_DIR)
-
-            # 3. Save the image as a JPG file using the student's name
-            # We replace spaces with underscores just to be safe (e.g., "John Doe" -> "John_Doe.jpg")
-            safe_filename = student_name.replace(" ", "_") + ".jpg"
-            save_path = os.path.join(KNOWN_FACES_DIR, safe_filename)
-            
-            # Write the image
-            cv2.imwrite(save_path, cv2_img)
+            # 1. Convert the uploaded/captured file to an RGB image
+            # (very large photos are decoded at a reduced size, see ingest.py)
+            rgb_img, _ = ingest.decode_rgb(img_buffer.getvalue())
+
+            # 2. Encode the face once and add it to the shared gallery.
+            # This also saves the photo to 'known_faces' (or 'known_faces/<name>/'
+            # for extra photos) and appends the encoding to the on-disk store,
+            # so the rest of the class is never re-encoded.
+            resources.get_face_store().enroll(student_name, rgb_img, replace=not add_extra)
 
             st.success(f"✅ Successfully added **{student_name}** to the database!")
-            
-            # 4. CRITICAL: Clear the cache so the Main App reloads the new face!
-            st.cache_resource.clear()
             st.info("The system has been updated. You can now go to the Main Page and take attendance.")
 
+        except quality.PhotoRejected as e:
+            # Nothing was saved; tell the teacher what to fix and let them retake the photo
+            st.error("❌ This photo can't be used:\n" + "\n".join(f"- {p}" for p in e.problems))
         except Exception as e:
-            st.error(f"Error saving student: {e}")
\ No newline at end of file
+            st.error(f"Error saving student: {e}")
+# --- REMOVE LOGIC ---
+st.divider()
+st.subheader("🗑️ Remove a Student")
+
+_, enrolled_names, _ = resources.get_face_store().snapshot()
+if enrolled_names:
+    student_to_remove = st.selectbox("Select Student", sorted(set(enrolled_names)))
+    if st.button("Remove Student from Database"):
+        if resources.get_face_store().remove(student_to_remove):
+            st.success(f"✅ Removed **{student_to_remove}** from the database.")
+        else:
+            st.warning(f"**{student_to_remove}** was already removed.")
+else:
+    st.info("No students in the database yet.")
+
+# Photos copied into 'known_faces' by hand that had no usable face. They are
+# skipped at startup without being processed again until the file changes.
+rejected = resources.get_face_store().rejected
+if rejected:
+    with st.expander(f"⚠️ {len(rejected)} photo(s) in 'known_faces' were skipped"):
+        for r in rejected:
+            st.write(f"**{r['file']}**: {' '.join(r['problems'])}")
@@ -1,5 +1,4 @@
 import streamlit as st
-import pandas as pd
 import os
 import sys
 from datetime import date
@@ -7,12 +6,13 @@ from datetime import date
 # Add the main folder to the path (for login_system)
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import auth # <--- Import auth
+from face_store import FaceStore
+from student_store import StudentStore
 
 # --- LOGIN CHECK ---
 if not auth.check_password():
     st.stop()
 # --- CONFIGURATION ---
-DETAILS_FILE = "student_details.csv"
 KNOWN_FACES_DIR = "known_faces"
 
 # Define your subjects and exam types exactly as requested
@@ -31,37 +31,33 @@ st.set_page_config(page_title="Student Details", page_icon="📝", layout="wide"
 st.title("📝 Student Details & Marks")
 
 # --- 1. FUNCTION TO GET STUDENT NAMES ---
+# Same photos as the recognition gallery ('Name.jpg' and 'Name/*.jpg'),
+# listed from the folder so the face encodings don't have to be loaded
 def get_student_list():
-    if not os.path.exists(KNOWN_FACES_DIR):
-        return []
-    return [os.path.splitext(f)[0] for f in os.listdir(KNOWN_FACES_DIR) if f.endswith((".jpg", ".png", ".jpeg"))]
-
-# --- 2. FUNCTION TO LOAD DATABASE (With Auto-Update for New Columns) ---
-def load_data():
-    # 1. Define ALL columns we need (Basic Info + 24 Mark columns)
-    basic_cols = ["Name", "Address", "Contact", "Emergency_Contact", "Blood_Type", "DOB"]
-    mark_cols = [f"{sub}_{exam}" for sub in SUBJECTS for exam in EXAMS]
-    all_columns = basic_cols + mark_cols
-
-    # 2. If file doesn't exist, create empty one
-    if not os.path.exists(DETAILS_FILE):
-        return pd.DataFrame(columns=all_columns)
-    
-    # 3. Load existing file
-    df = pd.read_csv(DETAILS_FILE)
-    
-    # 4. CRITICAL: Add missing columns if they don't exist yet
-    # (This prevents crashes when you update the app)
-    for col in all_columns:
-        if col not in df.columns:
-            df[col] = 0 if "_" in col and "Contact" not in col else "" # Default marks to 0, text to empty
-
-    df['DOB'] = df['DOB'].astype(str)
-    return df
+    return FaceStore(KNOWN_FACES_DIR).list_students()
+
+# --- 2. STUDENT DATABASE ---
+# One SQLite row per student, so saving is a single keyed upsert
+# (student_details.csv is imported automatically the first time)
+@st.cache_resource
+def get_store():
+    return StudentStore()
+
+# Cached read of the whole class table, refreshed only when a save bumps the version
+@st.cache_data(max_entries=4, show_spinner=False)
+def load_data(version):
+    return get_store().all_records(SUBJECTS, EXAMS)
+
+# Class statistics for every subject and exam, computed together in one vectorised pass
+@st.cache_data(max_entries=4, show_spinner=False)
+def load_analytics(version):
+    table = get_store().marks_table()
+    return table.group_stats(), table.rankings()
 
 # --- 3. MAIN UI ---
 all_students = get_student_list()
-df = load_data()
+store = get_store()
+df = load_data(store.version())
 
 if not all_students:
     st.warning("No students found! Go to 'Add Student' page first.")
@@ -71,17 +67,16 @@ if not all_students:
 selected_student = st.selectbox("Select Student to Edit", all_students)
 
 # --- GET EXISTING DATA ---
-student_data = df[df['Name'] == selected_student]
+# Only this student's row is read
+student_data = store.get(selected_student) or {"Marks": {}}
 
 # Helper function to safely get a value
 def get_val(column, default):
-    if not student_data.empty and column in student_data.columns:
-        val = student_data.iloc[0][column]
-        # Check for NaN (empty) values and return default
-        if pd.isna(val) or val == "nan": 
-            return default
-        return val
-    return default
+    val = student_data["Marks"].get(column, student_data.get(column))   # column = (subject, exam) for marks
+    # Check for missing/empty values and return default
+    if val is None or val == "" or val == "nan":
+        return default
+    return val
 
 # Get Basic Info
 current_address = get_val("Address", "")
@@ -130,9 +125,9 @@ with st.form("details_form"):
             # Helper to create number inputs
             def create_input(col_obj, exam_name):
                 col_name = f"{subject}_{exam_name}"
-                current_mark = float(get_val(col_name, 0.0))
+                current_mark = float(get_val((subject, exam_name), 0.0))
                 # Store the input in our dictionary
-                new_marks[col_name] = col_obj.number_input(f"{exam_name}", value=current_mark, min_value=0.0, max_value=100.0, key=col_name)
+                new_marks[(subject, exam_name)] = col_obj.number_input(f"{exam_name}", value=current_mark, min_value=0.0, max_value=100.0, key=col_name)
 
             create_input(c1, "Internal")
             create_input(c2, "CS1")
@@ -154,25 +149,31 @@ with st.form("details_form"):
             "DOB": str(new_dob)
         }
         
-        # 2. Add the Marks Data
-        final_data.update(new_marks)
-        
-        # 3. Update DataFrame
-        if selected_student in df['Name'].values:
-            idx = df[df['Name'] == selected_student].index[0]
-            # Update columns individually to avoid pandas warnings
-            for key, value in final_data.items():
-                df.at[idx, key] = value
-        else:
-            new_row = pd.DataFrame([final_data])
-            df = pd.concat([df, new_row], ignore_index=True)
-            
-        # 4. Save to CSV
-        df.to_csv(DETAILS_FILE, index=False)
+        # 2. Save this one student (details + marks) in a single upsert
+        store.upsert(selected_student, final_data, new_marks)
         st.success(f"✅ Data for **{selected_student}** updated successfully!")
         st.rerun() # Refresh to show new data in table
 
 # --- DISPLAY ALL DATA TABLE ---
 st.divider()
 st.subheader("📋 Class Database")
-st.dataframe(df)
\ No newline at end of file
+st.dataframe(df)
+
+# --- CLASS ANALYTICS ---
+st.divider()
+st.subheader("📊 Class Analytics")
+stats, rankings = load_analytics(store.version())
+
+if stats.empty:
+    st.info("No marks saved yet.")
+else:
+    st.caption("Mean, spread and percentiles for every subject and exam")
+    st.dataframe(stats.set_index(["Subject", "Exam"]))
+
+    a1, a2 = st.columns(2)
+    with a1:
+        rank_subject = st.selectbox("Subject", SUBJECTS, key="rank_subject")
+    with a2:
+        rank_exam = st.selectbox("Exam", EXAMS, key="rank_exam")
+    ranked = rankings[(rankings["Subject"] == rank_subject) & (rankings["Exam"] == rank_exam)]
+    st.dataframe(ranked.sort_values("Rank")[["Name", "Score", "Rank", "Percentile"]].set_index("Name"))
@@ -0,0 +1,79 @@
+import streamlit as st
+import pandas as pd
+
+import auth # <--- Import auth
+import metrics
+
+# --- LOGIN CHECK ---
+if not auth.check_password():
+    st.stop()
+
+st.set_page_config(page_title="Metrics", page_icon="⏱️", layout="wide")
+st.title("⏱️ Pipeline Metrics")
+
+# --- ADMIN ONLY ---
+if not auth.is_admin():
+    st.error("This page is only available to administrators.")
+    st.stop()
+
+if not metrics.ENABLED:
+    st.warning("Metrics are switched off (SMART_ATTENDANCE_METRICS=0), so nothing is being recorded.")
+
+if st.button("🔄 Refresh"):
+    pass # Just re-runs the script
+
+snapshot = metrics.snapshot()
+st.caption(f"Collected by this server process over the last {snapshot['uptime_s'] / 60:.1f} minutes.")
+
+# --- 1. COUNTERS AND GAUGES ---
+col1, col2 = st.columns(2)
+with col1:
+    st.subheader("Counters")
+    if snapshot["counters"]:
+        st.dataframe(pd.Series(snapshot["counters"], name="Count"))
+    else:
+        st.info("Nothing counted yet.")
+with col2:
+    st.subheader("Gauges")
+    if snapshot["gauges"]:
+        st.dataframe(pd.Series(snapshot["gauges"], name="Value"))
+    else:
+        st.info("No gauges set yet.")
+
+# --- 2. LATENCY PER STAGE ---
+st.subheader("Latency per Stage (ms)")
+histograms = snapshot["histograms"]
+latency = {name: h for name, h in histograms.items() if name.startswith(("stage.", "http."))}
+if latency:
+    table = pd.DataFrame({
+        name: {key: h[key] for key in ("count", "mean", "p50", "p95", "p99", "max")}
+        for name, h in latency.items()
+    }).T
+    st.dataframe(table.style.format("{:.1f}", subset=["mean", "p50", "p95", "p99", "max"]))
+    st.bar_chart(table["mean"])
+
+    # Full bucket counts for one stage
+    stage = st.selectbox("Histogram for", list(latency))
+    st.bar_chart(pd.Series(latency[stage]["buckets"], name="Photos"))
+else:
+    st.info("No photos have been processed since the server started.")
+
+# --- 3. FACES PER IMAGE ---
+if "faces_per_image" in histograms:
+    st.subheader("Faces per Image")
+    faces = histograms["faces_per_image"]
+    st.write(f"{faces['count']} photos, {faces['mean']:.1f} faces on average, at most {faces['max']:.0f}.")
+
+# --- 4. MEMORY PER PHOTO ---
+if "peak_memory_mb" in histograms:
+    st.subheader("Peak Memory per Photo (MB)")
+    memory = histograms["peak_memory_mb"]
+    st.write(f"{memory['count']} photos, {memory['mean']:.1f} MB on average, p95 {memory['p95']:.0f} MB, "
+             f"at most {memory['max']:.0f} MB (measured in the recognition workers, "
+             f"for the photos sampled by SMART_ATTENDANCE_TRACE_MEMORY).")
+
+# --- 5. EXPORT / RESET ---
+st.download_button("⬇️ Download as JSON", metrics.dump_json(), file_name="metrics.json", mime="application/json")
+if st.button("🗑️ Reset Metrics"):
+    metrics.reset()
+    st.rerun()
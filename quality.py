@@ -0,0 +1,82 @@
+"""
+Checks that an enrollment photo is good enough to recognise a student from.
+
+A photo passes when it shows exactly one face that is big enough, sharp
+enough and neither too dark nor blown out. The face is encoded during the
+check, so a passing photo never has to be processed again.
+"""
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+import recognition
+
+# --- CONFIGURATION ---
+MIN_FACE_SIZE = 80        # pixels, the shorter side of the face box
+MIN_SHARPNESS = 40.0      # variance of the Laplacian over the face (lower = blurrier)
+MIN_BRIGHTNESS = 50       # mean grey level of the face, 0-255
+MAX_BRIGHTNESS = 215
+
+# Result of check_photo().
+#   problems -> list of human-readable reasons the photo was rejected (empty = OK)
+#   box      -> (top, right, bottom, left) of the face, or None
+#   encoding -> its 128-d float32 encoding (only computed for photos that pass)
+QualityReport = namedtuple("QualityReport", ["problems", "box", "encoding", "sharpness", "brightness"])
+
+
+class PhotoRejected(ValueError):
+    """Raised when an enrollment photo fails the quality check."""
+
+    def __init__(self, problems):
+        super().__init__(" ".join(problems))
+        self.problems = list(problems)
+
+
+def face_scores(rgb_image, box):
+    """Returns (sharpness, brightness) of the face inside 'box'."""
+    top, right, bottom, left = box
+    face = cv2.cvtColor(rgb_image[max(top, 0):bottom, max(left, 0):right], cv2.COLOR_RGB2GRAY)
+    if face.size == 0:
+        return 0.0, 0.0
+    sharpness = float(cv2.Laplacian(face, cv2.CV_64F).var())
+    return sharpness, float(face.mean())
+
+
+def check_photo(rgb_image, strict=True):
+    """
+    Runs the quality gate on one photo and returns a QualityReport.
+
+    strict=False only requires exactly one face (used for photos that were
+    copied into 'known_faces' by hand, which we don't want to drop for
+    being a little soft); strict=True also checks size, blur and exposure.
+    """
+    boxes = recognition.detect_faces(rgb_image)
+    if not boxes:
+        return QualityReport(["No face was found in the photo."], None, None, None, None)
+    if len(boxes) > 1:
+        return QualityReport([f"{len(boxes)} faces were found; the photo must show only the student."],
+                             None, None, None, None)
+
+    box = boxes[0]
+    sharpness, brightness = face_scores(rgb_image, box)
+    problems = []
+    if strict:
+        top, right, bottom, left = box
+        if min(bottom - top, right - left) < MIN_FACE_SIZE:
+            problems.append(f"The face is too small ({min(bottom - top, right - left)} px, "
+                            f"at least {MIN_FACE_SIZE} px needed). Move closer to the camera.")
+        if sharpness < MIN_SHARPNESS:
+            problems.append(f"The photo is too blurry (sharpness {sharpness:.0f}, at least {MIN_SHARPNESS:.0f}). "
+                            "Hold the camera still.")
+        if brightness < MIN_BRIGHTNESS:
+            problems.append(f"The face is too dark (brightness {brightness:.0f}). Add more light.")
+        elif brightness > MAX_BRIGHTNESS:
+            problems.append(f"The face is overexposed (brightness {brightness:.0f}). Avoid direct light.")
+    if problems:
+        return QualityReport(problems, box, None, sharpness, brightness)
+
+    encodings = recognition.encode_faces(rgb_image, [box])
+    if not encodings:
+        return QualityReport(["The face could not be encoded."], box, None, sharpness, brightness)
+    return QualityReport([], box, np.asarray(encodings[0], dtype=np.float32), sharpness, brightness)
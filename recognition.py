@@ -0,0 +1,267 @@
+import atexit
+import collections
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+# --- CONFIGURATION ---
+# Detection runs on a downscaled copy whose longest side is at most this many
+# pixels; boxes are mapped back and faces are encoded at full resolution.
+# Raise it (or pass scale=1.0) if small faces at the back of the room are missed.
+DETECTION_MAX_SIDE = 1600
+DETECTION_UPSAMPLE = 1     # dlib upsampling passes; each one finds smaller faces but costs ~4x
+DETECTION_MODEL = "hog"    # "cnn" is more accurate but needs a GPU to be usable
+NMS_IOU = 0.3              # boxes overlapping more than this are the same face
+
+# Tiled mode: very large photos are cut into overlapping tiles that are
+# detected and encoded in parallel on a process pool. The overlap must be
+# bigger than the largest face so every face fits whole in some tile.
+TILED_MIN_SIDE = 3000      # photos with a longer side than this are tiled automatically
+TILE_SIZE = 1024
+TILE_OVERLAP = 256
+TILE_WORKERS = None        # None = one per CPU core
+
+# Everything found in one photo. 'timings' maps stage name -> seconds.
+Recognition = collections.namedtuple("Recognition", ["boxes", "encodings", "matches", "timings"])
+
+# Importing face_recognition loads dlib and its model files, which takes
+# seconds, so it only happens on the first detection (see load_models()).
+face_recognition = None
+
+
+def load_models():
+    """Imports face_recognition (loading dlib's models) on first use and returns the module."""
+    global face_recognition
+    if face_recognition is None:
+        import face_recognition as models
+        face_recognition = models
+    return face_recognition
+
+
+def auto_scale(shape, max_side=DETECTION_MAX_SIDE):
+    """Returns the factor that brings the longest side down to 'max_side' (never upscales)."""
+    longest = max(shape[0], shape[1])
+    return min(1.0, float(max_side) / longest) if longest else 1.0
+
+
+def box_iou(a, b):
+    """Intersection-over-union of two (top, right, bottom, left) boxes."""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+def non_max_suppression(boxes, scores=None, iou_threshold=NMS_IOU):
+    """
+    Returns the indices of the boxes to keep, dropping any box that overlaps a
+    better one by more than 'iou_threshold'. Without scores, larger boxes win.
+    """
+    if scores is None:
+        scores = [(b[2] - b[0]) * (b[1] - b[3]) for b in boxes]
+    keep = []
+    for i in sorted(range(len(boxes)), key=lambda i: scores[i], reverse=True):
+        if all(box_iou(boxes[i], boxes[j]) <= iou_threshold for j in keep):
+            keep.append(i)
+    return sorted(keep)
+
+
+def _detect_at_scale(rgb_img, scale, upsample, model):
+    height, width = rgb_img.shape[:2]
+    if scale >= 1.0:
+        small = rgb_img
+    else:
+        small = cv2.resize(rgb_img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    boxes = []
+    for top, right, bottom, left in load_models().face_locations(small, upsample, model):
+        # Map back to original image coordinates
+        boxes.append((
+            max(0, int(round(top / scale))),
+            min(width, int(round(right / scale))),
+            min(height, int(round(bottom / scale))),
+            max(0, int(round(left / scale))),
+        ))
+    return boxes
+
+
+def detect_faces(rgb_img, scale=None, pyramid=None, upsample=DETECTION_UPSAMPLE, model=DETECTION_MODEL):
+    """
+    Finds faces on a downscaled copy of the image and returns their boxes in
+    full-resolution (top, right, bottom, left) coordinates.
+
+    scale   -> resize factor for detection (default: from DETECTION_MAX_SIDE)
+    pyramid -> optional list of scales to run instead; results are merged with NMS
+    """
+    if pyramid:
+        boxes = []
+        for s in pyramid:
+            boxes.extend(_detect_at_scale(rgb_img, s, upsample, model))
+        return [boxes[i] for i in non_max_suppression(boxes)]
+
+    if scale is None:
+        scale = auto_scale(rgb_img.shape)
+    return _detect_at_scale(rgb_img, scale, upsample, model)
+
+
+def encode_faces(rgb_img, boxes):
+    """
+    Returns one 128-d encoding per box, computed at full resolution.
+
+    dlib only looks at the landmarks inside each box, so this is the
+    per-face crop cost, not a pass over the whole image.
+    """
+    if not boxes:
+        return []
+    return load_models().face_encodings(rgb_img, boxes)
+
+
+# --- TILED DETECTION ---
+_pool = None
+_pool_workers = None
+
+
+def _get_pool(workers):
+    """
+    Returns the tiling process pool, starting it if needed. It lives until
+    shutdown_tile_pool(), so a script that tiles several photos loads dlib
+    once per pool process. The recognition workers (worker_pool._run_job)
+    stop it after every tiled photo instead, so there each photo pays for
+    starting TILE_WORKERS processes that import dlib and load the models.
+    """
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        # "spawn": forking a process that runs threads (e.g. the Streamlit server) isn't safe
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        _pool_workers = workers
+    return _pool
+
+
+@atexit.register
+def shutdown_tile_pool():
+    """Stops the tiling processes (they are started again on the next tiled photo)."""
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown(wait=False)
+    _pool = _pool_workers = None
+
+
+def _tile_starts(length, tile, overlap):
+    if length <= tile:
+        return [0]
+    step = tile - overlap
+    starts = list(range(0, length - tile, step))
+    starts.append(length - tile)
+    return starts
+
+
+def _detect_tile(tile, origin, image_shape, scale, upsample, model):
+    """
+    Detects and encodes the faces in one tile (runs in a worker process).
+
+    Returns (box, encoding, touches_cut) tuples with boxes in full-image
+    coordinates. touches_cut marks boxes that hit a tile edge which is not
+    also an image edge, i.e. faces that may be cut in half.
+    """
+    y0, x0 = origin
+    height, width = tile.shape[:2]
+    if scale is None:
+        scale = auto_scale(tile.shape)
+    boxes = _detect_at_scale(tile, scale, upsample, model)
+    encodings = encode_faces(tile, boxes)
+
+    results = []
+    for (top, right, bottom, left), encoding in zip(boxes, encodings):
+        touches_cut = ((top <= 0 and y0 > 0)
+                       or (left <= 0 and x0 > 0)
+                       or (bottom >= height and y0 + height < image_shape[0])
+                       or (right >= width and x0 + width < image_shape[1]))
+        box = (top + y0, right + x0, bottom + y0, left + x0)
+        results.append((box, encoding, touches_cut))
+    return results
+
+
+def detect_and_encode_tiled(rgb_img, scale=None, upsample=DETECTION_UPSAMPLE, model=DETECTION_MODEL,
+                            tile_size=TILE_SIZE, overlap=TILE_OVERLAP, workers=TILE_WORKERS):
+    """
+    Splits a large image into overlapping tiles, detects and encodes every
+    tile on a process pool and merges faces found twice at tile borders (NMS).
+
+    Returns (boxes, encodings) in full-image coordinates. workers=1 runs the
+    tiles in this process.
+    """
+    height, width = rgb_img.shape[:2]
+    jobs = []
+    for y0 in _tile_starts(height, tile_size, overlap):
+        for x0 in _tile_starts(width, tile_size, overlap):
+            tile = np.ascontiguousarray(rgb_img[y0:y0 + tile_size, x0:x0 + tile_size])
+            jobs.append((tile, (y0, x0), rgb_img.shape, scale, upsample, model))
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1 or len(jobs) == 1:
+        per_tile = [_detect_tile(*job) for job in jobs]
+    else:
+        pool = _get_pool(workers)
+        per_tile = list(pool.map(_detect_tile, *zip(*jobs)))
+
+    found = [face for tile_faces in per_tile for face in tile_faces]
+    boxes = [box for box, _, _ in found]
+    # Prefer complete faces over ones cut by a tile edge, then larger boxes
+    scores = [(0 if cut else 1, (b[2] - b[0]) * (b[1] - b[3])) for b, _, cut in found]
+    keep = non_max_suppression(boxes, scores)
+
+    # A sliver of a face cut by a tile edge can have a low IoU with the whole
+    # face found in the neighbouring tile, so also drop cut boxes that lie
+    # mostly inside a complete one
+    complete = [boxes[i] for i in keep if not found[i][2]]
+    keep = [i for i in keep if not found[i][2] or not any(_mostly_inside(boxes[i], b) for b in complete)]
+    return [found[i][0] for i in keep], [found[i][1] for i in keep]
+
+
+def _mostly_inside(inner, outer):
+    top, bottom = max(inner[0], outer[0]), min(inner[2], outer[2])
+    left, right = max(inner[3], outer[3]), min(inner[1], outer[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area = (inner[2] - inner[0]) * (inner[1] - inner[3])
+    return area > 0 and inter / area > 0.5
+
+
+def recognize(rgb_img, matcher, method="greedy", scale=None, pyramid=None, tiled=None):
+    """
+    Runs detect -> encode -> match on one RGB image and times every stage.
+
+    tiled=None tiles automatically when the photo is larger than TILED_MIN_SIDE.
+    """
+    timings = {}
+    if tiled is None:
+        tiled = max(rgb_img.shape[:2]) > TILED_MIN_SIDE
+
+    if tiled:
+        # Detection and encoding happen together inside each tile worker
+        start = time.perf_counter()
+        boxes, encodings = detect_and_encode_tiled(rgb_img, scale=scale)
+        timings["detect+encode (tiled)"] = time.perf_counter() - start
+    else:
+        start = time.perf_counter()
+        boxes = detect_faces(rgb_img, scale=scale, pyramid=pyramid)
+        timings["detect"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        encodings = encode_faces(rgb_img, boxes)
+        timings["encode"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matches = matcher.assign(encodings, method=method)
+    timings["match"] = time.perf_counter() - start
+
+    return Recognition(boxes, encodings, matches, timings)
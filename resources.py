@@ -0,0 +1,73 @@
+import threading
+
+import streamlit as st
+
+from face_store import FaceStore, KNOWN_FACES_DIR
+from matcher import FaceMatcher
+from worker_pool import RecognitionPool
+
+# Resources cached here are shared by the main app and every page, for all
+# sessions of the Streamlit server process.
+
+
+# Nothing heavy is loaded at import time: the gallery is read on the first
+# get_face_store() call and the face models only inside the worker processes,
+# so pages that just show the attendance log open straight away.
+_prewarm_lock = threading.Lock()
+_prewarm_started = False
+
+
+@st.cache_resource
+def _face_store():
+    return FaceStore(KNOWN_FACES_DIR)
+
+
+def get_face_store():
+    """
+    Returns the process-wide face gallery, loaded from the on-disk store on
+    first use and re-read whenever another process (e.g. server.py) saved it.
+    """
+    return _face_store().ensure_loaded()
+
+
+def get_matcher():
+    """Returns a FaceMatcher for the current gallery, rebuilt only when the gallery changes."""
+    encodings, names, version = get_face_store().snapshot()
+    return _build_matcher(encodings, names, version)
+
+
+@st.cache_resource(max_entries=2)
+def _build_matcher(_encodings, _names, version):
+    # Only 'version' is part of the cache key; the underscored arguments are not hashed
+    return FaceMatcher(_encodings, _names)
+
+
+@st.cache_resource
+def get_recognition_pool(method="greedy", scale=None):
+    """Returns the process-wide pool of recognition workers (started on first use)."""
+    return RecognitionPool(KNOWN_FACES_DIR, method=method, scale=scale)
+
+
+def prewarm(method="greedy", scale=None):
+    """
+    Loads the gallery and warms up the recognition workers in a background
+    thread (once per server process), e.g. right after login, so the first
+    photo doesn't wait for them. Returns without waiting.
+    """
+    global _prewarm_started
+    with _prewarm_lock:
+        if _prewarm_started:
+            return
+        _prewarm_started = True
+    # Resolved here, in the script thread, where st.cache_resource is available
+    store = _face_store()
+    pool = get_recognition_pool(method, scale)
+
+    def warm_up():
+        store.ensure_loaded()
+        try:
+            pool.prewarm()
+        except RuntimeError:
+            pass   # the server is shutting down; warming up is only a head start anyway
+
+    threading.Thread(target=warm_up, name="prewarm", daemon=True).start()
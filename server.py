@@ -0,0 +1,290 @@
+"""
+A small HTTP API for kiosks and scripts (no browser needed).
+
+    python server.py --port 8000 --workers 4
+
+Endpoints (JSON in, JSON out; images are base64 strings):
+    GET  /health             -> {"students": 12, "pending": 0}
+    GET  /metrics            -> stage latency histograms, counters and gauges (see metrics.py)
+    POST /enroll             {"name": "Jane Doe", "image": "<base64>", "replace": true}
+                             (replace=false adds an extra photo of the student)
+    POST /recognize          {"image": "<base64>", "log": true}
+                             (or the raw JPEG/PNG bytes with Content-Type: image/jpeg,
+                             logged with POST /recognize?log=1)
+    POST /batch-recognize    {"images": ["<base64>", ...], "log": true}
+
+The gallery is loaded once for the server process and re-read when another
+process (e.g. the Streamlit app) enrolls or removes a student. Recognition
+runs in the server's own pool of worker processes (worker_pool.py, the same
+code the Streamlit app uses), connections are kept alive (HTTP/1.1) and
+every request is handled on its own thread. When
+the workers are saturated, or a worker died while handling the photos, the
+API answers 503 with Retry-After.
+
+If the SMART_ATTENDANCE_API_TOKEN environment variable is set, every request
+must send "Authorization: Bearer <token>".
+"""
+import argparse
+import base64
+import binascii
+import collections
+import hmac
+import json
+import os
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import ingest
+import metrics
+from attendance_log import ATTENDANCE_BACKEND, get_attendance_log
+from face_store import FaceStore, KNOWN_FACES_DIR
+from matcher import UNKNOWN
+from worker_pool import MAX_PENDING, RECOGNITION_WORKERS, QueueFull, RecognitionPool, WorkerLost
+
+# --- CONFIGURATION ---
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+MAX_BODY_BYTES = 50 * 1024 * 1024   # biggest request we accept (a batch of photos)
+MAX_BATCH = 32                      # photos per /batch-recognize request
+JOB_TIMEOUT = 120                   # seconds to wait for one photo before giving up
+API_TOKEN = os.environ.get("SMART_ATTENDANCE_API_TOKEN")
+
+
+class APIError(Exception):
+    """An error that is sent back to the client as {"error": message}."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _decode_base64(value, field):
+    if not isinstance(value, str):
+        raise APIError(400, f"'{field}' must be a base64 string.")
+    try:
+        return base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        raise APIError(400, f"'{field}' is not valid base64.")
+
+
+class AttendanceServer(ThreadingHTTPServer):
+    """Holds what every request shares: the gallery, the worker pool and the log."""
+
+    daemon_threads = True
+
+    def __init__(self, address, store, pool, attendance_log):
+        super().__init__(address, APIHandler)
+        self.store = store
+        self.pool = pool
+        self.attendance_log = attendance_log
+
+    def recognize_many(self, images, log):
+        """
+        Queues the photos so they run in parallel and returns one report per
+        photo, in order. When the queue is full we collect our own oldest job
+        before submitting more; QueueFull is only raised if none of ours is
+        running (i.e. other clients have filled the queue).
+        """
+        token = self.store.ensure_loaded().version   # picks up students enrolled by the app
+        reports = [None] * len(images)
+        running = collections.deque()
+        for i, image_bytes in enumerate(images):
+            while True:
+                try:
+                    running.append((i, self.pool.submit(image_bytes, token, annotate=False)))
+                    break
+                except QueueFull:
+                    if not running:
+                        raise
+                    j, job_id = running.popleft()
+                    reports[j] = self._collect(job_id, log)
+        while running:
+            j, job_id = running.popleft()
+            reports[j] = self._collect(job_id, log)
+        return reports
+
+    def _collect(self, job_id, log):
+        try:
+            result = self.pool.wait(job_id, timeout=JOB_TIMEOUT)
+        except ValueError as e:
+            # e.g. an unreadable image; the other photos in the batch still count
+            return {"error": str(e)}
+        return self._report(result, log)
+
+    def _report(self, result, log):
+        present = sorted(set(n for n in result.names if n != UNKNOWN))
+        report = {
+            "faces": [{"box": list(box), "name": name, "distance": round(distance, 4)}
+                      for box, name, distance in zip(result.boxes, result.names, result.distances)],
+            "present": present,
+            "absent": sorted(set(result.roster) - set(present)),
+            "timings_ms": {stage: round(t * 1000, 1) for stage, t in result.timings.items()},
+            "cached": result.cached,
+        }
+        # A photo that was already logged (a kiosk retrying a request) isn't logged twice
+        if log and self.pool.claim_log(result.key):
+            statuses = {s: "Present" if s in present else "Absent" for s in result.roster}
+            start = time.perf_counter()
+            report["session"] = self.attendance_log.log_session(statuses)
+            metrics.record_timings({"log": time.perf_counter() - start})
+        return report
+
+
+class APIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep connections open between requests
+    server_version = "SmartAttendance/1.0"
+
+    # --- 1. PLUMBING ---
+    def _send_json(self, status, payload, headers=None):
+        metrics.count(f"http.status.{status}")
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            # We won't read it, so this connection can't be reused
+            self.close_connection = True
+            raise APIError(413, f"Request body is larger than {MAX_BODY_BYTES} bytes.")
+        return self.rfile.read(length)
+
+    def _read_json(self, body):
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            raise APIError(400, "Request body is not valid JSON.")
+        if not isinstance(payload, dict):
+            raise APIError(400, "Request body must be a JSON object.")
+        return payload
+
+    def _authorized(self):
+        if not API_TOKEN:
+            return True
+        sent = self.headers.get("Authorization", "")
+        return hmac.compare_digest(sent.encode("utf-8"), f"Bearer {API_TOKEN}".encode("utf-8"))
+
+    def _dispatch(self, routes):
+        path = self.path.split("?", 1)[0]
+        start = time.perf_counter()
+        try:
+            # Always drain the body, otherwise leftovers corrupt the next request on this connection
+            body = self._read_body() if self.command == "POST" else b""
+            if not self._authorized():
+                raise APIError(401, "Missing or wrong API token.")
+            route = routes.get(path)
+            if route is None:
+                raise APIError(404, f"No endpoint {self.command} {path}.")
+            self._send_json(200, route(body))
+        except APIError as e:
+            self._send_json(e.status, {"error": e.message})
+        except QueueFull as e:
+            self._send_json(503, {"error": f"Server busy: {e}"}, {"Retry-After": "2"})
+        except WorkerLost as e:
+            # The pool has already started new workers, so trying again can work
+            self._send_json(503, {"error": str(e)}, {"Retry-After": "2"})
+        except Exception as e:
+            self.log_error("%s %s failed: %r", self.command, path, e)
+            self._send_json(500, {"error": "Internal server error."})
+        if path in routes:
+            metrics.observe(f"http.{path}", (time.perf_counter() - start) * 1000)
+
+    def do_GET(self):
+        self._dispatch({"/health": self.health, "/metrics": self.metrics_snapshot})
+
+    def do_POST(self):
+        self._dispatch({
+            "/enroll": self.enroll,
+            "/recognize": self.recognize,
+            "/batch-recognize": self.batch_recognize,
+        })
+
+    # --- 2. ENDPOINTS ---
+    def health(self, body):
+        store = self.server.store.ensure_loaded()
+        return {"students": len(set(store.names)), "pending": self.server.pool.pending()}
+
+    def metrics_snapshot(self, body):
+        return metrics.snapshot()
+
+    def enroll(self, body):
+        payload = self._read_json(body)
+        name = payload.get("name")
+        if not isinstance(name, str) or not name.strip():
+            raise APIError(400, "'name' is required.")
+        try:
+            FaceStore.file_stem(name)   # checked before the (slow) quality gate
+        except ValueError as e:
+            raise APIError(400, str(e))
+        image_bytes = _decode_base64(payload.get("image"), "image")
+
+        try:
+            rgb_img, _ = ingest.decode_rgb(image_bytes)
+            stem = self.server.store.enroll(name, rgb_img, replace=bool(payload.get("replace", True)))
+        except ValueError as e:
+            raise APIError(400, str(e))
+        return {"enrolled": stem, "students": len(set(self.server.store.names))}
+
+    def recognize(self, body):
+        if self.headers.get("Content-Type", "").startswith("image/"):
+            # Raw bodies (e.g. a kiosk camera posting frames) say whether to log in the URL
+            query = parse_qs(urlsplit(self.path).query)
+            log = query.get("log", ["0"])[-1].lower() in ("1", "true", "yes")
+            images = [body]
+        else:
+            payload = self._read_json(body)
+            images, log = [_decode_base64(payload.get("image"), "image")], bool(payload.get("log", False))
+        report = self.server.recognize_many(images, log)[0]
+        if "error" in report:
+            raise APIError(400, report["error"])
+        return report
+
+    def batch_recognize(self, body):
+        payload = self._read_json(body)
+        encoded = payload.get("images")
+        if not isinstance(encoded, list) or not encoded:
+            raise APIError(400, "'images' must be a non-empty list.")
+        if len(encoded) > MAX_BATCH:
+            raise APIError(400, f"At most {MAX_BATCH} images per batch.")
+        images = [_decode_base64(value, f"images[{i}]") for i, value in enumerate(encoded)]
+        return {"results": self.server.recognize_many(images, bool(payload.get("log", False)))}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=DEFAULT_HOST, help="address to listen on (0.0.0.0 for the whole network)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--known-faces", default=KNOWN_FACES_DIR, help="folder of enrolled student photos")
+    parser.add_argument("--workers", type=int, default=RECOGNITION_WORKERS, help="recognition worker processes")
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING, help="queued photos before answering 503")
+    parser.add_argument("--method", choices=["greedy", "hungarian"], default="greedy")
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default=ATTENDANCE_BACKEND)
+    parser.add_argument("--log", help="CSV file or SQLite database to write to (default: the backend's usual file)")
+    args = parser.parse_args(argv)
+
+    print("Loading known faces...")
+    store = FaceStore(args.known_faces).load()
+    pool = RecognitionPool(args.known_faces, workers=args.workers, max_pending=args.max_pending, method=args.method)
+    server = AttendanceServer((args.host, args.port), store, pool, get_attendance_log(args.backend, args.log))
+
+    print(f"...{len(set(store.names))} students loaded. Listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
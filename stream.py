@@ -0,0 +1,216 @@
+"""
+Continuous attendance from a video file or a live camera.
+
+Examples:
+    python stream.py 0                      # first webcam, press q in the window (or Ctrl+C) to stop
+    python stream.py entrance.mp4 --every 10 --no-show
+
+Faces are only detected every Nth frame. In between, each face is followed
+by a cheap box tracker, and a face is encoded and recognised once when its
+track starts (re-identified only if the track is lost). When the stream
+ends one roster is written to the attendance log.
+"""
+import argparse
+import sys
+import time
+
+import cv2
+
+import recognition
+from attendance_log import get_attendance_log
+from face_store import FaceStore, KNOWN_FACES_DIR
+from matcher import FaceMatcher, UNKNOWN
+
+# --- CONFIGURATION ---
+DETECT_EVERY = 5          # run the face detector on every Nth frame
+TRACK_IOU = 0.3           # a detection continues a track if their boxes overlap this much
+MAX_MISSED = 3            # detection rounds a track may go unseen before it is dropped
+UNKNOWN_RETRIES = 3       # re-encode an unrecognised track this many times (face may turn later)
+
+
+class Track:
+    """One face followed across frames."""
+
+    def __init__(self, track_id, box, frame_no):
+        self.id = track_id
+        self.box = box                 # (top, right, bottom, left)
+        self.velocity = (0.0, 0.0)     # (dy, dx) per frame, for prediction between detections
+        self.name = UNKNOWN
+        self.distance = float("inf")
+        self.missed = 0
+        self.last_seen = frame_no      # frame of the last matching detection
+        self.attempts = 0              # times this track was encoded
+
+    def predict(self):
+        """Moves the box along its last known velocity (one frame)."""
+        dy, dx = self.velocity
+        top, right, bottom, left = self.box
+        self.box = (top + dy, right + dx, bottom + dy, left + dx)
+
+    def update(self, box, frame_no):
+        """Snaps to a fresh detection and re-estimates the velocity."""
+        frames_since = max(1, frame_no - self.last_seen)
+        old_cy = (self.box[0] + self.box[2]) / 2
+        old_cx = (self.box[1] + self.box[3]) / 2
+        new_cy = (box[0] + box[2]) / 2
+        new_cx = (box[1] + box[3]) / 2
+        # The old box was already predicted forward, so this is the correction per frame
+        self.velocity = (self.velocity[0] + (new_cy - old_cy) / frames_since,
+                         self.velocity[1] + (new_cx - old_cx) / frames_since)
+        self.box = box
+        self.missed = 0
+        self.last_seen = frame_no
+
+    def int_box(self):
+        return tuple(int(round(v)) for v in self.box)
+
+
+class FaceTracker:
+    """
+    Detect every Nth frame, track in between, encode each track once.
+
+    'seen' maps every recognised student to the best (smallest) distance
+    they were matched with during the stream.
+    """
+
+    def __init__(self, matcher, detect_every=DETECT_EVERY, scale=None):
+        self.matcher = matcher
+        self.detect_every = max(1, detect_every)
+        self.scale = scale
+        self.tracks = []
+        self.seen = {}
+        self.frame_no = 0
+        self.encodings_done = 0
+        self._next_id = 1
+
+    def process(self, rgb_frame):
+        """Feeds one RGB frame; returns the active tracks."""
+        is_detection_frame = self.frame_no % self.detect_every == 0
+        self.frame_no += 1
+
+        for track in self.tracks:
+            track.predict()
+        if not is_detection_frame:
+            return self.tracks
+
+        boxes = recognition.detect_faces(rgb_frame, scale=self.scale)
+        self._associate(boxes)
+        self._identify(rgb_frame)
+        return self.tracks
+
+    def _associate(self, boxes):
+        """Greedily pairs detections with tracks by IoU; the rest start new tracks."""
+        pairs = []
+        for t, track in enumerate(self.tracks):
+            for d, box in enumerate(boxes):
+                iou = recognition.box_iou(track.box, box)
+                if iou >= TRACK_IOU:
+                    pairs.append((iou, t, d))
+        pairs.sort(reverse=True)
+
+        used_tracks, used_boxes = set(), set()
+        for _, t, d in pairs:
+            if t in used_tracks or d in used_boxes:
+                continue
+            self.tracks[t].update(boxes[d], self.frame_no)
+            used_tracks.add(t)
+            used_boxes.add(d)
+
+        for t, track in enumerate(self.tracks):
+            if t not in used_tracks:
+                track.missed += 1
+        self.tracks = [t for t in self.tracks if t.missed <= MAX_MISSED]
+
+        for d, box in enumerate(boxes):
+            if d not in used_boxes:
+                self.tracks.append(Track(self._next_id, box, self.frame_no))
+                self._next_id += 1
+
+    def _identify(self, rgb_frame):
+        """Encodes only new tracks (and a few retries for unrecognised ones), in one batch."""
+        pending = [t for t in self.tracks
+                   if t.missed == 0 and t.name == UNKNOWN and t.attempts < UNKNOWN_RETRIES]
+        if not pending:
+            return
+
+        encodings = recognition.encode_faces(rgb_frame, [t.int_box() for t in pending])
+        self.encodings_done += len(encodings)
+        for track, match in zip(pending, self.matcher.match(encodings)):
+            track.attempts += 1
+            if match.name == UNKNOWN:
+                continue
+            track.name = match.name
+            track.distance = match.distance
+            self.seen[match.name] = min(match.distance, self.seen.get(match.name, float("inf")))
+
+
+def open_source(source):
+    """A camera index ("0") or a video file/URL."""
+    return cv2.VideoCapture(int(source) if source.isdigit() else source)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="camera index (e.g. 0) or video file / stream URL")
+    parser.add_argument("--every", type=int, default=DETECT_EVERY, help="detect faces every N frames")
+    parser.add_argument("--scale", type=float, default=None, help="detection resize factor (default: automatic)")
+    parser.add_argument("--max-seconds", type=float, default=None, help="stop after this long")
+    parser.add_argument("--no-show", action="store_true", help="don't open a preview window")
+    parser.add_argument("--no-log", action="store_true", help="don't write the attendance log")
+    args = parser.parse_args(argv)
+
+    store = FaceStore(KNOWN_FACES_DIR).load()
+    matcher = FaceMatcher(store.encodings, store.names)
+    tracker = FaceTracker(matcher, detect_every=args.every, scale=args.scale)
+
+    capture = open_source(args.source)
+    if not capture.isOpened():
+        print(f"Could not open '{args.source}'.")
+        return 1
+
+    print(f"Watching '{args.source}' for {len(set(matcher.names))} students. Press q or Ctrl+C to stop.")
+    start = time.perf_counter()
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            tracks = tracker.process(rgb_frame)
+
+            if not args.no_show:
+                for track in tracks:
+                    top, right, bottom, left = track.int_box()
+                    color = (0, 255, 0) if track.name != UNKNOWN else (0, 0, 255)
+                    cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
+                    cv2.putText(frame, track.name, (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+                cv2.imshow("Smart Attendance - Live", frame)
+                if cv2.waitKey(1) & 0xFF == ord("q"):
+                    break
+
+            if args.max_seconds and time.perf_counter() - start > args.max_seconds:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        capture.release()
+        if not args.no_show:
+            cv2.destroyAllWindows()
+
+    elapsed = time.perf_counter() - start
+    print("--------------------")
+    print(f"{tracker.frame_no} frames in {elapsed:.1f} s ({tracker.frame_no / max(elapsed, 1e-9):.1f} fps), "
+          f"{tracker.encodings_done} face encodings")
+    print(f"Present: {', '.join(sorted(tracker.seen)) or 'nobody'}")
+
+    if not args.no_log:
+        roster = sorted(set(matcher.names))
+        statuses = {s: "Present" if s in tracker.seen else "Absent" for s in roster}
+        attendance_log = get_attendance_log()
+        attendance_log.log_session(statuses)
+        print(f"Attendance has been logged to '{attendance_log.location}'.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+import contextlib
+import os
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# --- CONFIGURATION ---
+STUDENT_DB = "student_details.db"
+DETAILS_FILE = "student_details.csv"    # old format, imported once on first use
+BASIC_COLUMNS = ["Name", "Address", "Contact", "Emergency_Contact", "Blood_Type", "DOB"]
+
+
+def split_mark_column(column):
+    """'25ICMATT111_CS1' -> ('25ICMATT111', 'CS1') (the old wide column names)."""
+    subject, _, exam = column.rpartition("_")
+    return subject, exam
+
+
+class StudentStore:
+    """
+    Student details (one SQLite row per student) and marks in long format,
+    one (student, subject, exam, score) row per mark.
+
+    Saving a student is a single keyed upsert instead of rewriting the whole
+    CSV, and adding a subject or exam needs no schema change.
+    """
+
+    def __init__(self, path=STUDENT_DB, csv_path=DETAILS_FILE):
+        self.path = path
+        self.csv_path = csv_path
+        with contextlib.closing(self._connect()) as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS students (
+                    name TEXT PRIMARY KEY,
+                    address TEXT NOT NULL DEFAULT '',
+                    contact TEXT NOT NULL DEFAULT '',
+                    emergency_contact TEXT NOT NULL DEFAULT '',
+                    blood_type TEXT NOT NULL DEFAULT 'Unknown',
+                    dob TEXT NOT NULL DEFAULT '2000-01-01',
+                    updated_at TEXT
+                );
+                CREATE TABLE IF NOT EXISTS marks (
+                    name TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    exam TEXT NOT NULL,
+                    score REAL NOT NULL,
+                    PRIMARY KEY (name, subject, exam)
+                );
+                CREATE INDEX IF NOT EXISTS idx_marks_subject_exam ON marks (subject, exam);
+                -- Bumped on every write so cached reads know when to refresh
+                CREATE TABLE IF NOT EXISTS store_version (id INTEGER PRIMARY KEY CHECK (id = 0), version INTEGER NOT NULL);
+                INSERT OR IGNORE INTO store_version VALUES (0, 0);
+            """)
+            empty = conn.execute("SELECT 1 FROM students LIMIT 1").fetchone() is None
+        if empty and os.path.exists(csv_path):
+            self.import_csv(csv_path)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    # --- 1. READS ---
+    def version(self):
+        with contextlib.closing(self._connect()) as conn:
+            return conn.execute("SELECT version FROM store_version").fetchone()[0]
+
+    def get(self, name):
+        """
+        Returns one student's record as a dict (BASIC_COLUMNS + "Marks"), or None.
+        "Marks" maps (subject, exam) -> score.
+        """
+        with contextlib.closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT name, address, contact, emergency_contact, blood_type, dob "
+                "FROM students WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                return None
+            marks = conn.execute("SELECT subject, exam, score FROM marks WHERE name = ?", (name,)).fetchall()
+        record = dict(zip(BASIC_COLUMNS, row))
+        record["Marks"] = {(subject, exam): score for subject, exam, score in marks}
+        return record
+
+    def marks_table(self):
+        """Returns every mark as a MarksTable (typed arrays, long format)."""
+        with contextlib.closing(self._connect()) as conn:
+            rows = conn.execute("SELECT name, subject, exam, score FROM marks").fetchall()
+        return MarksTable.from_rows(rows)
+
+    def all_records(self, subjects=(), exams=()):
+        """
+        Returns every student as one wide DataFrame for display:
+        BASIC_COLUMNS + one "<SUBJECT>_<EXAM>" column per subject/exam (missing marks are 0).
+        """
+        with contextlib.closing(self._connect()) as conn:
+            details = pd.read_sql_query(
+                "SELECT name AS Name, address AS Address, contact AS Contact, "
+                "emergency_contact AS Emergency_Contact, blood_type AS Blood_Type, dob AS DOB "
+                "FROM students ORDER BY name", conn)
+
+        table = self.marks_table()
+        dense = table.to_dense(students=list(details["Name"]), subjects=subjects, exams=exams)
+        mark_cols = [f"{sub}_{exam}" for sub in subjects for exam in exams]
+        wide = pd.DataFrame(np.nan_to_num(dense.reshape(len(details), -1)), columns=mark_cols)
+        return pd.concat([details, wide], axis=1)
+
+    # --- 2. WRITES ---
+    def upsert(self, name, details, marks):
+        """
+        Inserts or updates one student.
+        'details' uses BASIC_COLUMNS keys, 'marks' maps (subject, exam) -> score.
+        """
+        with contextlib.closing(self._connect()) as conn:
+            with conn:
+                self._upsert(conn, name, details, marks)
+                conn.execute("UPDATE store_version SET version = version + 1")
+
+    def _upsert(self, conn, name, details, marks):
+        conn.execute("""
+            INSERT INTO students (name, address, contact, emergency_contact, blood_type, dob, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET
+                address = excluded.address,
+                contact = excluded.contact,
+                emergency_contact = excluded.emergency_contact,
+                blood_type = excluded.blood_type,
+                dob = excluded.dob,
+                updated_at = excluded.updated_at
+        """, (
+            name,
+            str(details.get("Address", "")),
+            str(details.get("Contact", "")),
+            str(details.get("Emergency_Contact", "")),
+            str(details.get("Blood_Type", "Unknown")),
+            str(details.get("DOB", "2000-01-01")),
+            datetime.now().isoformat(timespec="seconds"),
+        ))
+        conn.executemany(
+            "INSERT OR REPLACE INTO marks (name, subject, exam, score) VALUES (?, ?, ?, ?)",
+            [(name, subject, exam, float(score)) for (subject, exam), score in marks.items()])
+
+    def import_csv(self, csv_path):
+        """One-shot import of the old wide student_details.csv. Returns the row count."""
+        df = pd.read_csv(csv_path, dtype={"Contact": str, "Emergency_Contact": str, "DOB": str})
+        mark_cols = [c for c in df.columns if c not in BASIC_COLUMNS]
+        with contextlib.closing(self._connect()) as conn:
+            with conn:
+                for _, row in df.iterrows():
+                    details = {c: row[c] for c in BASIC_COLUMNS if c in row and not pd.isna(row[c])}
+                    marks = {split_mark_column(c): (0.0 if pd.isna(row[c]) else row[c]) for c in mark_cols}
+                    self._upsert(conn, row["Name"], details, marks)
+                conn.execute("UPDATE store_version SET version = version + 1")
+        return len(df)
+
+
+# --- 3. VECTORISED ANALYTICS ---
+class MarksTable:
+    """
+    Long-format marks as parallel typed arrays: integer codes for student,
+    subject and exam plus a float32 score per mark. Class statistics are
+    computed for every (subject, exam) group at once with NumPy.
+    """
+
+    def __init__(self, students, subjects, exams, student_idx, subject_idx, exam_idx, scores):
+        self.students = list(students)
+        self.subjects = list(subjects)
+        self.exams = list(exams)
+        self.student_idx = np.asarray(student_idx, dtype=np.int32)
+        self.subject_idx = np.asarray(subject_idx, dtype=np.int16)
+        self.exam_idx = np.asarray(exam_idx, dtype=np.int16)
+        self.scores = np.asarray(scores, dtype=np.float32)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Builds the table from (name, subject, exam, score) tuples."""
+        if not rows:
+            return cls([], [], [], [], [], [], [])
+        names, subjects, exams, scores = zip(*rows)
+        student_codes, students = pd.factorize(pd.Series(names), sort=True)
+        subject_codes, subject_list = pd.factorize(pd.Series(subjects), sort=True)
+        exam_codes, exam_list = pd.factorize(pd.Series(exams), sort=True)
+        return cls(students, subject_list, exam_list, student_codes, subject_codes, exam_codes, scores)
+
+    def __len__(self):
+        return len(self.scores)
+
+    def to_dense(self, students=None, subjects=None, exams=None):
+        """
+        Returns a (students x subjects x exams) float32 array, NaN where no mark
+        exists. The axes follow the given lists (default: the table's own).
+        """
+        students = self.students if students is None else list(students)
+        subjects = self.subjects if subjects is None else list(subjects)
+        exams = self.exams if exams is None else list(exams)
+        dense = np.full((len(students), len(subjects), len(exams)), np.nan, dtype=np.float32)
+        if len(self) == 0:
+            return dense
+
+        # Translate our codes to positions on the requested axes (-1 = not requested)
+        def remap(own, wanted):
+            pos = {v: i for i, v in enumerate(wanted)}
+            return np.array([pos.get(v, -1) for v in own], dtype=np.int64)
+
+        st_i = remap(self.students, students)[self.student_idx]
+        su_i = remap(self.subjects, subjects)[self.subject_idx]
+        ex_i = remap(self.exams, exams)[self.exam_idx]
+        keep = (st_i >= 0) & (su_i >= 0) & (ex_i >= 0)
+        dense[st_i[keep], su_i[keep], ex_i[keep]] = self.scores[keep]
+        return dense
+
+    def _grouped(self):
+        """Sorts marks by (group, score descending); returns the pieces every statistic needs."""
+        group = self.subject_idx.astype(np.int64) * len(self.exams) + self.exam_idx
+        order = np.lexsort((-self.scores, group))
+        sorted_group = group[order]
+        sorted_scores = self.scores[order]
+        n_groups = len(self.subjects) * len(self.exams)
+        counts = np.bincount(group, minlength=n_groups)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        return group, order, sorted_group, sorted_scores, counts, starts
+
+    def group_stats(self, percentiles=(25, 50, 75)):
+        """
+        Returns one row per (Subject, Exam) with Count, Mean, Std, Min, Max and
+        the requested percentiles, all computed in a single pass per statistic.
+        """
+        columns = ["Subject", "Exam", "Count", "Mean", "Std", "Min", "Max"] + [f"P{p}" for p in percentiles]
+        if len(self) == 0:
+            return pd.DataFrame(columns=columns)
+
+        group, _, _, sorted_scores, counts, starts = self._grouped()
+        n_groups = len(counts)
+        scores = self.scores.astype(np.float64)
+        sums = np.bincount(group, weights=scores, minlength=n_groups)
+        sq_sums = np.bincount(group, weights=scores * scores, minlength=n_groups)
+
+        present = counts > 0
+        c = counts[present]
+        mean = sums[present] / c
+        std = np.sqrt(np.maximum(sq_sums[present] / c - mean * mean, 0.0))
+        # Sorted descending inside each group: max first, min last
+        first = starts[present]
+        last = first + c - 1
+        ascending = sorted_scores[::-1]   # reversed view: each group ascending, groups in reverse
+        total = len(sorted_scores)
+
+        stats = {
+            "Subject": [self.subjects[g // len(self.exams)] for g in np.nonzero(present)[0]],
+            "Exam": [self.exams[g % len(self.exams)] for g in np.nonzero(present)[0]],
+            "Count": c,
+            "Mean": mean.round(2),
+            "Std": std.round(2),
+            "Min": sorted_scores[last],
+            "Max": sorted_scores[first],
+        }
+        for p in percentiles:
+            # Linear interpolation between the two closest ranks, like numpy.percentile
+            pos = (c - 1) * (p / 100.0)
+            lo, hi = np.floor(pos).astype(np.int64), np.ceil(pos).astype(np.int64)
+            lo_val = ascending[total - 1 - last + lo]
+            hi_val = ascending[total - 1 - last + hi]
+            stats[f"P{p}"] = (lo_val + (hi_val - lo_val) * (pos - lo)).round(2)
+        return pd.DataFrame(stats, columns=columns)
+
+    def rankings(self):
+        """
+        Returns every mark with its class Rank (1 = best, ties share the best
+        rank) and Percentile (share of the class scoring at or below it).
+        """
+        columns = ["Name", "Subject", "Exam", "Score", "Rank", "Percentile"]
+        if len(self) == 0:
+            return pd.DataFrame(columns=columns)
+
+        group, order, sorted_group, sorted_scores, counts, starts = self._grouped()
+        positions = np.arange(len(order))
+        # A new run starts where the group or the score changes; tied marks share the run's first position
+        new_run = np.ones(len(order), dtype=bool)
+        new_run[1:] = (sorted_group[1:] != sorted_group[:-1]) | (sorted_scores[1:] != sorted_scores[:-1])
+        run_start = np.maximum.accumulate(np.where(new_run, positions, 0))
+        sorted_rank = run_start - starts[sorted_group] + 1
+
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = sorted_rank
+        count = counts[group]
+        return pd.DataFrame({
+            "Name": np.asarray(self.students, dtype=object)[self.student_idx],
+            "Subject": np.asarray(self.subjects, dtype=object)[self.subject_idx],
+            "Exam": np.asarray(self.exams, dtype=object)[self.exam_idx],
+            "Score": self.scores,
+            "Rank": rank,
+            "Percentile": (100.0 * (count - rank + 1) / count).round(1),
+        }, columns=columns)
@@ -0,0 +1,377 @@
+"""
+A queue of recognition jobs served by a pool of worker processes.
+
+The Streamlit script only submits the photo bytes and polls for the result,
+so detection/encoding never runs in (or blocks) the script thread. Every
+worker loads the gallery once and reloads it only when it has changed.
+The number of queued + running jobs is capped; past that, submit() raises
+QueueFull so the caller can ask the user to try again instead of piling up
+work that would time out anyway.
+"""
+import atexit
+import contextlib
+import hashlib
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import types
+import uuid
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+import metrics
+from face_store import FaceStore, KNOWN_FACES_DIR
+from matcher import FaceMatcher
+
+# --- CONFIGURATION ---
+RECOGNITION_WORKERS = int(os.environ.get("RECOGNITION_WORKERS", os.cpu_count() or 1))
+MAX_PENDING = 4 * RECOGNITION_WORKERS   # queued + running jobs before submit() pushes back
+RESULT_TTL = 600                         # seconds an unclaimed result is kept
+RESULT_CACHE_SIZE = 64                   # finished photos remembered for reruns / re-uploads
+ANNOTATED_JPEG_QUALITY = 90              # the annotated preview (see ingest.PREVIEW_MAX_SIDE)
+# A photo bigger than recognition.TILED_MIN_SIDE that arrives while no other
+# photo is queued or running is cut into tiles detected on every core. Under
+# load each worker keeps to one core (tiling would only slow the others down).
+# Each tiled photo starts (and then stops) its own tiling processes, a few
+# seconds of loading dlib, which only pays off for photos that need it.
+TILE_WHEN_IDLE = True
+
+# What a finished job returns. 'encodings', 'names' and 'distances' have one
+# entry per box, 'roster' is the class list of the gallery the photo was
+# matched against, 'image' is the annotated photo as JPEG bytes (None if
+# annotate=False). 'key' is the photo's image_key() and 'cached' is True when
+# the result came from the cache instead of a worker. 'peak_mb' is the memory
+# the worker needed for the photo at its peak (None if not measured, see
+# ingest.TRACE_MEMORY_EVERY).
+PhotoResult = namedtuple("PhotoResult", ["boxes", "encodings", "names", "distances", "roster", "image",
+                                         "timings", "key", "cached", "peak_mb"], defaults=(None,))
+
+
+class QueueFull(Exception):
+    """Raised by submit() when MAX_PENDING jobs are already waiting."""
+
+
+class WorkerLost(Exception):
+    """
+    Raised by poll() / wait() for a job whose worker process died (e.g. it was
+    killed for using too much memory). Every job queued at that moment fails
+    with it; the pool starts new workers for the jobs submitted after.
+    """
+
+
+# --- 1. WORKER SIDE ---
+# Set once per worker process by _init_worker()
+_store = None
+_matcher = None
+_matcher_version = None   # the FaceStore.version _matcher was built from
+
+
+def _init_worker(faces_dir):
+    global _store
+    # Read-only: only the app (or server.py) writes the store, under its lock
+    _store = FaceStore(faces_dir, read_only=True)
+
+
+def _ensure_gallery():
+    """
+    Re-reads this worker's gallery whenever any process has saved the store
+    since the last job, so every worker matches against the same, latest one.
+    """
+    global _matcher, _matcher_version
+    _store.ensure_loaded()
+    encodings, names, version = _store.snapshot()
+    if _matcher is None or version != _matcher_version:
+        _matcher = FaceMatcher(encodings, names)
+        _matcher_version = version
+    return _matcher
+
+
+def _warm_up():
+    """Loads the face models and the gallery ahead of the first real job."""
+    import recognition
+    recognition.load_models()
+    _ensure_gallery()
+    return os.getpid()
+
+
+def _run_job(image_bytes, method, scale, annotate, allow_tiling=False):
+    """Decodes, recognises and (optionally) annotates one photo."""
+    # Imported here so the app process never pays for OpenCV or the models
+    import ingest
+    import recognition
+
+    started = time.time()
+    timings = {}
+    matcher = _ensure_gallery()
+
+    # Only worth it for photos too big for one detection pass (see TILE_WHEN_IDLE)
+    size = ingest.image_size(image_bytes) if allow_tiling else None
+    tiled = size is not None and max(size) > recognition.TILED_MIN_SIDE
+
+    with ingest.PeakMemory() as memory:
+        # Decoded at a capped size, already in RGB order
+        start = time.perf_counter()
+        max_side = ingest.TILED_MAX_DECODE_SIDE if tiled else ingest.MAX_DECODE_SIDE
+        rgb_img, factor = ingest.decode_rgb(image_bytes, max_side)
+        timings["decode"] = time.perf_counter() - start
+
+        result = recognition.recognize(rgb_img, matcher, method=method, scale=scale, tiled=tiled)
+        if tiled:
+            # Don't leave a pool of dlib processes behind in every worker that got a big
+            # photo; the next tiled photo starts a fresh one (see recognition._get_pool)
+            recognition.shutdown_tile_pool()
+        timings.update(result.timings)
+        names = [m.name for m in result.matches]
+        distances = [float(m.distance) for m in result.matches]
+
+        image = None
+        if annotate:
+            start = time.perf_counter()
+            image = ingest.annotate(rgb_img, result.boxes, names, ANNOTATED_JPEG_QUALITY)
+            timings["annotate"] = time.perf_counter() - start
+        del rgb_img
+
+    # Boxes are reported in the coordinates of the photo that was uploaded
+    boxes = ingest.scale_boxes(result.boxes, factor)
+    encodings = [np.asarray(e, dtype=np.float32) for e in result.encodings]
+    return started, PhotoResult(boxes, encodings, names, distances, sorted(set(matcher.names)), image,
+                                timings, None, False, memory.mb)
+
+
+# --- 2. APP SIDE ---
+# A "spawn" worker first re-runs the parent's __main__ module. Under Streamlit
+# that is the page script itself (Streamlit installs it as __main__), which
+# would then run the whole page, and create its own pool, in every worker.
+# Workers are therefore started with this empty stand-in as __main__.
+_EMPTY_MAIN = types.ModuleType("__main__")
+
+
+@contextlib.contextmanager
+def _empty_main():
+    main = sys.modules.get("__main__")
+    sys.modules["__main__"] = _EMPTY_MAIN
+    try:
+        yield
+    finally:
+        # Leave it alone if a Streamlit rerun installed its script meanwhile
+        if sys.modules.get("__main__") is _EMPTY_MAIN:
+            sys.modules["__main__"] = main
+
+
+def image_key(image_bytes, gallery_token):
+    """Identifies a recognition result: the same photo against the same gallery."""
+    return hashlib.sha1(image_bytes).hexdigest(), gallery_token
+
+
+class RecognitionPool:
+    """
+    submit() a photo, then poll() with the returned job id until the result
+    is ready. Safe to share between Streamlit sessions (threads).
+
+    Finished results are kept in a small LRU cache keyed by image_key(), so
+    re-uploads and Streamlit reruns of the same photo come back instantly
+    (with cached=True) and identical photos submitted at the same time are
+    only processed once. claim_log() lets callers write each photo's
+    attendance only once.
+    """
+
+    def __init__(self, faces_dir=KNOWN_FACES_DIR, workers=RECOGNITION_WORKERS, max_pending=MAX_PENDING,
+                 method="greedy", scale=None, cache_size=RESULT_CACHE_SIZE, tile_when_idle=TILE_WHEN_IDLE):
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.method = method
+        self.scale = scale
+        self.cache_size = cache_size
+        self.tile_when_idle = tile_when_idle
+        self._faces_dir = faces_dir
+        self._executor = self._new_executor()
+        self._jobs = {}                      # job id -> (future, submitted at, key)
+        self._inflight = {}                  # key -> future, while it is queued or running
+        self._cache = OrderedDict()          # key -> [PhotoResult, logged?], oldest first
+        self._lock = threading.RLock()   # re-entrant: done callbacks can fire inside submit()
+        atexit.register(self.shutdown)
+
+    def _new_executor(self):
+        # "spawn" rather than fork: the Streamlit server (and server.py) run many threads
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                   initargs=(self._faces_dir,), mp_context=multiprocessing.get_context("spawn"))
+
+    def _replace_executor(self, broken):
+        """
+        Once one worker dies, a ProcessPoolExecutor refuses all further work,
+        so 'broken' is swapped for a new one (unless that already happened).
+        """
+        with self._lock:
+            if self._executor is not broken:
+                return
+            metrics.count("worker_pool_restarts")
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._new_executor()
+            # Their futures fail with BrokenProcessPool; nothing may join them any more
+            self._inflight.clear()
+            metrics.set_gauge("pending_jobs", 0)
+
+    def pending(self):
+        """Jobs that are queued or running."""
+        with self._lock:
+            return len(self._inflight)
+
+    def submit(self, image_bytes, gallery_token, annotate=True):
+        """
+        Queues a photo and returns its job id. 'gallery_token' is the
+        FaceStore.version the caller knows; it keys the result cache, so a
+        photo is recognised again once the gallery has changed. (The workers
+        themselves always match against the store as last saved.)
+        """
+        key = image_key(image_bytes, gallery_token)
+        with self._lock:
+            self._forget_stale()
+            job_id = uuid.uuid4().hex
+            future = self._cached_future(key, annotate) or self._inflight.get(key)
+            if future is None:
+                if len(self._inflight) >= self.max_pending:
+                    metrics.count("queue_full")
+                    raise QueueFull(f"{self.max_pending} photos are already waiting.")
+                allow_tiling = self.tile_when_idle and not self._inflight
+                args = (_run_job, bytes(image_bytes), self.method, self.scale, annotate, allow_tiling)
+                executor = self._executor
+                with _empty_main():   # submit() may start a new worker process
+                    try:
+                        future = executor.submit(*args)
+                    except BrokenProcessPool:
+                        # A worker died since the last job: start over with new workers
+                        self._replace_executor(executor)
+                        executor = self._executor
+                        future = executor.submit(*args)
+                self._inflight[key] = future
+                future.add_done_callback(lambda f: self._job_done(key, f, executor))
+                metrics.set_gauge("pending_jobs", len(self._inflight))
+            self._jobs[job_id] = (future, time.time(), key)
+        return job_id
+
+    def poll(self, job_id):
+        """
+        Returns None while the job is queued or running, else its PhotoResult
+        (with a "queue" timing added). Re-raises the worker's exception if the
+        job failed. Unknown job ids raise KeyError.
+        """
+        with self._lock:
+            future, submitted, key = self._jobs[job_id]
+            if not future.done():
+                return None
+            del self._jobs[job_id]
+        return self._finish(future, submitted, key)
+
+    def wait(self, job_id, timeout=None):
+        """Blocks until the job is done and returns its PhotoResult (for non-UI callers)."""
+        with self._lock:
+            future, submitted, key = self._jobs[job_id]
+        try:
+            future.exception(timeout=timeout)   # waits; _finish() raises the job's error
+        finally:
+            with self._lock:
+                if future.done():
+                    self._jobs.pop(job_id, None)
+        return self._finish(future, submitted, key)
+
+    def claim_log(self, key):
+        """
+        True the first time it is called for a cached result, False after
+        that, so a photo's attendance is written once however often it is
+        re-submitted (as long as it stays in the cache).
+        """
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return True
+            if entry[1]:
+                return False
+            entry[1] = True
+            return True
+
+    def prewarm(self):
+        """
+        Starts every worker and has it load the models and the gallery now,
+        so the first real photo doesn't pay for it. Returns immediately;
+        the warm-up jobs just run ahead of anything submitted later.
+        """
+        with self._lock, _empty_main():
+            executor = self._executor
+            try:
+                return [executor.submit(_warm_up) for _ in range(self.workers)]
+            except BrokenProcessPool:
+                self._replace_executor(executor)
+                return []
+
+    # --- cache plumbing ---
+    def _cached_future(self, key, annotate):
+        entry = self._cache.get(key)
+        if entry is None or (annotate and entry[0].image is None):
+            return None
+        self._cache.move_to_end(key)
+        future = Future()
+        future.set_result((None, entry[0]))   # no start time: it never queued
+        return future
+
+    def _job_done(self, key, future, executor):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            metrics.set_gauge("pending_jobs", len(self._inflight))
+            if future.cancelled() or future.exception() is not None:
+                metrics.count("photos_failed")
+                if isinstance(future.exception(), BrokenProcessPool):
+                    self._replace_executor(executor)
+                return
+            result = future.result()[1]
+            self._remember(key, result)
+        # The workers time every stage; they are recorded here, once per photo
+        metrics.record_timings(result.timings)
+        metrics.observe("faces_per_image", len(result.boxes))
+        if result.peak_mb is not None:
+            metrics.observe("peak_memory_mb", result.peak_mb)
+        metrics.set_gauge("gallery_students", len(result.roster))
+        metrics.count("photos_processed")
+
+    def _remember(self, key, result):
+        # Called from the done callback and from _finish(), whichever comes first
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                self._cache[key] = [result, False]
+            elif entry[0].image is None and result.image is not None:
+                entry[0] = result   # an annotated re-run of a photo cached without its image; keep 'logged'
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _finish(self, future, submitted, key):
+        try:
+            started, result = future.result()
+        except BrokenProcessPool:
+            # _job_done() has already replaced the executor
+            raise WorkerLost("A recognition worker stopped unexpectedly (out of memory?). "
+                             "Please submit the photo again.") from None
+        # Results are shared through the cache, so hand out copies of the timings
+        if started is None:
+            metrics.count("cache_hits")
+            return result._replace(timings={"queue": 0.0}, key=key, cached=True)
+        self._remember(key, result)
+        timings = dict(result.timings, queue=max(0.0, started - submitted))
+        metrics.observe("stage.queue", timings["queue"] * 1000)
+        return result._replace(timings=timings, key=key)
+
+    def _forget_stale(self):
+        # Results nobody came back for (e.g. the browser tab was closed)
+        cutoff = time.time() - RESULT_TTL
+        for job_id, (future, submitted, _) in list(self._jobs.items()):
+            if future.done() and submitted < cutoff:
+                del self._jobs[job_id]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)